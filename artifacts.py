@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import numpy as np
+
+# --- Config ---
+ARTIFACT_DIR = './artifacts'
+MANIFEST_FILE = 'manifest.json'
+RECORDS_FILE = 'records.bin'
+OFFSETS_FILE = 'records_offsets.npy'
+BUILDS_DIR = 'builds'  # one directory per build_search_index.py run
+SEARCH_INDEX = 'search_index'  # index arrays, inside a build directory
+BUILDS_KEPT = 2  # published builds left on disk; older ones are removed
+
+# Serving artifacts are plain .npy arrays (opened with mmap) plus a flat blob of
+# UTF-8 JSON records indexed by an offsets array. Nothing is pickled or
+# compressed, so every worker maps the same pages from the OS cache.
+
+# --- Helpers ---
+def replace_file(path, write):
+    # Write next to the target and rename over it: readers that already mapped
+    # the old file keep its inode, new readers see the complete new file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def write_manifest(directory, **fields):
+    manifest = {"created_at": time.time(), **fields}
+    replace_file(os.path.join(directory, MANIFEST_FILE),
+                 lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+    return manifest
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# --- Builds ---
+# A build writes the index and every corpus's records into a fresh directory,
+# then repoints ARTIFACT_DIR's manifest at it. Published files are never
+# rewritten, so a reader that resolves the manifest once sees one build only.
+def new_build_dir(artifact_dir=ARTIFACT_DIR):
+    builds = os.path.join(artifact_dir, BUILDS_DIR)
+    os.makedirs(builds, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=builds)
+    os.chmod(build_dir, 0o755)  # mkdtemp makes it private to the building user
+    return build_dir
+
+def publish_build(build_dir, artifact_dir=ARTIFACT_DIR, keep=BUILDS_KEPT):
+    manifest = write_manifest(artifact_dir, build=os.path.relpath(build_dir, artifact_dir))
+    # Workers still serving a removed build keep its mapped files until they reload
+    builds = os.path.join(artifact_dir, BUILDS_DIR)
+    current = os.path.basename(build_dir)
+    for name in sorted(os.listdir(builds))[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(builds, name), ignore_errors=True)
+    return manifest
+
+def current_build(artifact_dir=ARTIFACT_DIR):
+    # Artifacts built before builds were versioned sit directly in artifact_dir
+    try:
+        return os.path.join(artifact_dir, read_manifest(artifact_dir)["build"])
+    except FileNotFoundError:
+        return artifact_dir
+
+# --- Arrays ---
+def save_arrays(directory, arrays, **manifest):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        replace_file(os.path.join(directory, f"{name}.npy"),
+                     lambda f, a=array: np.save(f, np.asarray(a), allow_pickle=False))
+    return write_manifest(directory, arrays=sorted(arrays), **manifest)
+
+def load_arrays(directory, mmap=True):
+    manifest = read_manifest(directory)
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+        for name in manifest["arrays"]
+    }
+    return manifest, arrays
+
+# --- Records ---
+def write_records(directory, records):
+    os.makedirs(directory, exist_ok=True)
+    offsets = [0]
+
+    def write_blob(f):
+        for record in records:
+            data = json.dumps(record, ensure_ascii=False).encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+
+    replace_file(os.path.join(directory, RECORDS_FILE), write_blob)
+    replace_file(os.path.join(directory, OFFSETS_FILE),
+                 lambda f: np.save(f, np.array(offsets, dtype=np.int64), allow_pickle=False))
+    return len(offsets) - 1
+
+
+class RecordStore:
+    # Read-only, lazily decoded view over a records blob
+    def __init__(self, directory):
+        self.directory = directory
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+        blob_path = os.path.join(directory, RECORDS_FILE)
+        if os.path.getsize(blob_path):
+            self.blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            self.blob = np.empty(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise IndexError(f"record {idx} out of range")
+        idx %= len(self)
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return json.loads(self.blob[start:end].tobytes().decode('utf-8'))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
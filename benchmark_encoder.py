@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import numpy as np
+from artifacts import RecordStore, current_build
+from encoder import ENCODER_BACKENDS
+
+# --- Config ---
+SAMPLE_SIZE = int(os.getenv("BENCH_SAMPLE", "256"))  # texts encoded per backend
+QUERY_REPEATS = 100  # single-question encodes timed per backend
+BATCH_SIZE = 32
+
+# --- Helpers ---
+def sample_texts():
+    # Forum titles stand in for questions, course chunks for long passages
+    forum = RecordStore(os.path.join(current_build(), 'forum'))
+    course = RecordStore(os.path.join(current_build(), 'course'))
+    titles = [forum[i]["title"] for i in range(min(len(forum), SAMPLE_SIZE // 2))]
+    chunks = [course[i]["text"] for i in range(min(len(course), SAMPLE_SIZE - len(titles)))]
+    return titles, titles + chunks
+
+def measure(backend):
+    # Runs in its own process so import time and peak RSS belong to one backend
+    start = time.perf_counter()
+    from encoder import load_encoder
+    encoder = load_encoder(backend)
+    load_s = time.perf_counter() - start
+
+    questions, texts = sample_texts()
+    latencies = []
+    for question in (questions * QUERY_REPEATS)[:QUERY_REPEATS]:
+        start = time.perf_counter()
+        encoder.encode(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True)
+    batch_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "backend": getattr(encoder, "backend", "torch"),  # "torch" if the ONNX path fell back
+        "load_s": load_s,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "batch_texts_per_s": len(texts) / batch_s,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+# --- Main ---
+def run():
+    # Latency and memory only; embedding parity with PyTorch is checked by test_encoder.py
+    results = {}
+    for backend in ENCODER_BACKENDS:
+        child = subprocess.run([sys.executable, __file__, "--measure", backend], capture_output=True, text=True)
+        if child.returncode != 0:
+            print(f"❌ {backend} failed:\n{child.stderr}")
+            continue
+        results[backend] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'backend':<10} {'ran as':<10} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8} {'RSS MB':>7}")
+    for backend, r in results.items():
+        print(f"{backend:<10} {r['backend']:<10} {r['load_s']:>7.2f} {r['query_p50_ms']:>7.2f} "
+              f"{r['query_p95_ms']:>7.2f} {r['batch_texts_per_s']:>8.1f} {r['peak_rss_mb']:>7.0f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        measure(sys.argv[2])
+    else:
+        run()
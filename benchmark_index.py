@@ -0,0 +1,75 @@
+import os
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from embedding_store import STORE_DTYPES
+from vector_index import build_index, normalize
+
+# --- Config ---
+FORUM_EMBED_FILE = './tds_forum_data/tds_embeddings_with_metadata.npz'
+COURSE_EMBED_FILE = './course_embeddings.npz'
+TOP_K = 3
+NUM_QUERIES = 200
+QUERY_NOISE = 0.05
+SCALE = int(os.getenv("BENCH_SCALE", "1"))  # replicate the corpus to simulate several terms
+NPROBE_VALUES = [1, 2, 4, 8, 16, 32]
+
+# --- Helpers ---
+def load_corpus():
+    forum = np.load(FORUM_EMBED_FILE, allow_pickle=True)['embeddings']
+    course = np.load(COURSE_EMBED_FILE, allow_pickle=True)['embeddings']
+    corpus = np.vstack([forum, course]).astype(np.float32)
+    rng = np.random.default_rng(0)
+    copies = [corpus] + [corpus + rng.normal(0, QUERY_NOISE, corpus.shape).astype(np.float32)
+                         for _ in range(SCALE - 1)]
+    return np.vstack(copies)
+
+def make_queries(corpus, n):
+    # Perturbed corpus vectors stand in for real questions (no model needed)
+    rng = np.random.default_rng(1)
+    picks = corpus[rng.choice(len(corpus), size=n, replace=False)]
+    return picks + rng.normal(0, QUERY_NOISE * 4, picks.shape).astype(np.float32)
+
+def brute_force(query, corpus, k=TOP_K):
+    # The original main.py search path
+    sims = cosine_similarity([query], corpus)[0]
+    return np.argsort(sims)[::-1][:k]
+
+def time_per_query(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+def recall(results, truth):
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / sum(len(t) for t in truth)
+
+# --- Main ---
+def run():
+    corpus = load_corpus()
+    queries = make_queries(corpus, NUM_QUERIES)
+    print(f"📐 Corpus: {corpus.shape[0]} x {corpus.shape[1]}, queries: {len(queries)}, k={TOP_K}")
+
+    base_ms, truth = time_per_query(lambda q: brute_force(q, corpus), queries)
+    print(f"{'brute-force (sklearn)':<24} {base_ms:8.3f} ms/query  recall=1.000")
+
+    for dtype in STORE_DTYPES:
+        exact = build_index(corpus, kind="exact", dtype=dtype)
+        ms, results = time_per_query(lambda q: exact.search(q, k=TOP_K), queries)
+        label = f"exact {dtype}"
+        mb = exact.store.vectors.nbytes / 2**20
+        print(f"{label:<24} {ms:8.3f} ms/query  recall={recall(results, truth):.3f}  "
+              f"speedup={base_ms / ms:.1f}x  {mb:.1f} MB")
+
+    start = time.perf_counter()
+    ivf = build_index(normalize(corpus), kind="ivf")
+    print(f"🧭 IVF build: nlist={ivf.nlist} in {time.perf_counter() - start:.2f}s")
+    for nprobe in NPROBE_VALUES:
+        if nprobe > ivf.nlist:
+            break
+        ms, results = time_per_query(lambda q: ivf.search(q, k=TOP_K, nprobe=nprobe), queries)
+        label = f"ivf nprobe={nprobe}"
+        print(f"{label:<24} {ms:8.3f} ms/query  recall={recall(results, truth):.3f}  speedup={base_ms / ms:.1f}x")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import time
+from caches import SemanticCache, normalize_question
+from encoder import load_encoder
+
+# --- Config ---
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "./query_log.jsonl")
+THRESHOLDS = [0.85, 0.88, 0.9, 0.92, 0.95]
+CACHE_SIZE = 512
+SAMPLE_MATCHES = 5
+
+# --- Helpers ---
+def load_questions(path):
+    # JSONL written by main.py (QUERY_LOG_FILE), or one question per line
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+def replay(questions, embeddings, threshold):
+    cache = SemanticCache(dim=embeddings.shape[1], maxsize=CACHE_SIZE, threshold=threshold)
+    exact_repeats, matches = 0, []
+    seen = set()
+    start = time.perf_counter()
+    for question, embedding in zip(questions, embeddings):
+        cached, similarity = cache.lookup(embedding)
+        key = normalize_question(question)
+        if cached is None:
+            cache.put(embedding, question)
+        elif cached != question:
+            matches.append((similarity, question, cached))
+        exact_repeats += key in seen
+        seen.add(key)
+    lookup_ms = (time.perf_counter() - start) / len(questions) * 1000
+    return cache.stats(), exact_repeats, lookup_ms, matches
+
+# --- Main ---
+def run():
+    if not os.path.exists(QUERY_LOG_FILE):
+        sys.exit(f"❌ {QUERY_LOG_FILE} not found; set QUERY_LOG_FILE on the server to record one")
+    questions = load_questions(QUERY_LOG_FILE)
+    print(f"📂 Replaying {len(questions)} logged questions from {QUERY_LOG_FILE}")
+
+    model = load_encoder()
+    embeddings = model.encode([normalize_question(q) for q in questions], batch_size=64,
+                              show_progress_bar=True, convert_to_numpy=True)
+
+    for threshold in THRESHOLDS:
+        stats, exact_repeats, lookup_ms, matches = replay(questions, embeddings, threshold)
+        print(f"\nthreshold={threshold:.2f}  semantic hit rate={stats['hit_rate']:.3f}  "
+              f"(exact-match cache would hit {exact_repeats / len(questions):.3f})  "
+              f"lookup+insert={lookup_ms:.3f} ms")
+        # Lowest-similarity reuses are where false positives show up first
+        for similarity, question, cached in sorted(matches)[:SAMPLE_MATCHES]:
+            print(f"   {similarity:.3f}  {question!r}  ->  {cached!r}")
+
+if __name__ == "__main__":
+    run()
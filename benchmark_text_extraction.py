@@ -0,0 +1,96 @@
+import json
+import time
+import numpy as np
+from create_embeddings import INPUT_FILE
+from embedding_store import normalize, top_k_rows
+from html_text import html_to_text, post_text
+
+# --- Config ---
+REPEATS = 3  # passes over the corpus per extractor; the best one is reported
+TOP_K_VALUES = [1, 3, 10]
+BATCH_SIZE = 64
+
+# --- Helpers ---
+def html_input(post):
+    # What create_embeddings.py used to embed: the cooked HTML, tags and all
+    if "cooked_html_with_captions" in post:
+        return post["cooked_html_with_captions"].strip()
+    return "\n".join(part for part in [post.get("cooked_html", "").strip(), *post.get("image_captions", [])]
+                     if part.strip())
+
+def soup_text(html):
+    # The html.parser BeautifulSoup path fetch_full_posts.py used
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser").get_text().strip()
+
+def extractors():
+    found = {"lxml html_to_text": html_to_text}
+    try:
+        import bs4  # noqa: F401 (no longer a dependency; compared only if installed)
+        found["bs4 html.parser"] = soup_text
+    except ImportError:
+        print("⚠️ bs4 not installed: skipping the BeautifulSoup baseline")
+    return found
+
+def throughput(posts):
+    htmls = [post.get("cooked_html", "") for post in posts]
+    megabytes = sum(len(html.encode("utf-8")) for html in htmls) / 2**20
+    print(f"📄 {len(htmls)} posts, {megabytes:.1f} MB of HTML")
+    for name, extract in extractors().items():
+        best = float("inf")
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            for html in htmls:
+                extract(html)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:<20} {len(htmls) / best:10.0f} posts/s  {megabytes / best:7.1f} MB/s")
+
+def token_lengths(tokenizer, texts):
+    return np.array([len(ids) for ids in tokenizer(texts, add_special_tokens=True)["input_ids"]])
+
+def retrieval_quality(model, variants, posts):
+    # Known-item search: each topic title is the query, any post of that topic
+    # counts as relevant. Titles are not part of the embedded text.
+    topics = sorted({post["topic_id"] for post in posts})
+    titles = [next(post["title"] for post in posts if post["topic_id"] == t) or "" for t in topics]
+    relevant = [{i for i, post in enumerate(posts) if post["topic_id"] == t} for t in topics]
+    queries = normalize(model.encode(titles, batch_size=BATCH_SIZE))
+    max_k = max(TOP_K_VALUES)
+
+    print(f"🎯 {len(topics)} title queries over {len(posts)} posts")
+    for name, texts in variants.items():
+        corpus = normalize(model.encode(texts, batch_size=BATCH_SIZE))
+        ranked = top_k_rows(queries @ corpus.T, len(posts))
+        first_hit = [next((rank for rank, i in enumerate(row) if i in rel), None)
+                     for row, rel in zip(ranked, relevant)]
+        recalls = "  ".join(f"recall@{k}={np.mean([r is not None and r < k for r in first_hit]):.3f}"
+                            for k in TOP_K_VALUES)
+        mrr = np.mean([1 / (r + 1) if r is not None and r < max_k else 0.0 for r in first_hit])
+        print(f"{name:<20} {recalls}  mrr@{max_k}={mrr:.3f}")
+
+# --- Main ---
+def run():
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        posts = [post for post in json.load(f) if html_input(post)]
+
+    throughput(posts)
+
+    from encoder import load_encoder
+    model = load_encoder("torch")
+    variants = {
+        "html (before)": [html_input(post) for post in posts],
+        "text (after)": [post_text(post) for post in posts],
+    }
+
+    tokenizer, max_tokens = getattr(model, "tokenizer", None), getattr(model, "max_seq_length", None)
+    if tokenizer is not None and max_tokens:
+        print(f"✂️ Token budget ({max_tokens} tokens per input)")
+        for name, texts in variants.items():
+            lengths = token_lengths(tokenizer, texts)
+            print(f"{name:<20} mean={lengths.mean():7.1f} tokens  p95={np.percentile(lengths, 95):7.0f}  "
+                  f"truncated={np.mean(lengths > max_tokens):.1%}  chars={sum(map(len, texts))}")
+
+    retrieval_quality(model, variants, posts)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,57 @@
+import os
+import json
+import numpy as np
+from artifacts import SEARCH_INDEX, new_build_dir, publish_build, write_records
+from vector_index import MultiSourceIndex, save_index
+
+# --- Config ---
+FORUM_EMBED_FILE = './tds_forum_data/tds_embeddings_with_metadata.npz'
+COURSE_EMBED_FILE = './course_embeddings.npz'
+COURSE_CHUNKS_META = './course_chunks.json'
+INDEX_KIND = os.getenv("INDEX_KIND", "exact")  # "exact" or "ivf"
+INDEX_DTYPE = os.getenv("INDEX_DTYPE", "float32")  # "float32", "float16" or "int8"
+
+# --- Corpus loaders (build time only: the .npz files may hold pickled metadata) ---
+def load_course_corpus():
+    with np.load(COURSE_EMBED_FILE) as data:
+        embeddings, texts = data['embeddings'], data['texts']
+    with open(COURSE_CHUNKS_META, 'r', encoding='utf-8') as f:
+        chunk_meta = json.load(f)
+    records = [{**meta, "text": str(text)} for text, meta in zip(texts, chunk_meta)]
+    return embeddings, records
+
+def load_forum_corpus():
+    with np.load(FORUM_EMBED_FILE, allow_pickle=True) as data:
+        embeddings, metadata = data['embeddings'], data['metadata']
+    return embeddings, [dict(post) for post in metadata]
+
+# Corpus name -> loader. Order is the order sections appear in the prompt.
+CORPUS_LOADERS = {
+    "course": load_course_corpus,
+    "forum": load_forum_corpus,
+}
+
+# --- Build serving artifacts ---
+def build_search_index():
+    # Everything goes into a new build directory, published only once complete
+    build_dir = new_build_dir()
+    corpora = {}
+    for name, loader in CORPUS_LOADERS.items():
+        try:
+            embeddings, records = loader()
+        except FileNotFoundError as e:
+            print(f"⚠️ Skipping '{name}' corpus: {e}")
+            continue
+        write_records(os.path.join(build_dir, name), records)
+        corpora[name] = embeddings
+
+    print(f"🧭 Building {INDEX_KIND} index over: " +
+          ", ".join(f"{name} ({len(emb)})" for name, emb in corpora.items()))
+    index = MultiSourceIndex.build(corpora, kind=INDEX_KIND, dtype=INDEX_DTYPE)
+    save_index(index, os.path.join(build_dir, SEARCH_INDEX))
+    publish_build(build_dir)
+    print(f"✅ Saved search index and records to: {build_dir}")
+    return index
+
+if __name__ == "__main__":
+    build_search_index()
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# --- Helpers ---
+def normalize_question(text):
+    # Case, surrounding punctuation and whitespace runs don't change the question
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.strip(" ?!.")
+
+# --- LRU cache with TTL ---
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (stored_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self):
+        # Live (non-expired) entries, oldest first, with their store time
+        now = time.time()
+        with self._lock:
+            return [(key, stored_at, value) for key, (stored_at, value) in self._data.items()
+                    if not self._expired(stored_at, now)]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# --- Query embedding cache ---
+class EmbeddingCache(LRUCache):
+    # Persisted as a plain .npz of keys, store times and vectors (no pickle)
+    def save(self, path):
+        entries = self.items()
+        if not entries:
+            return 0
+        keys, stored_at, vectors = zip(*entries)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), stored_at=np.array(stored_at),
+                 vectors=np.stack(vectors).astype(np.float32))
+        os.replace(tmp_path, path)
+        return len(keys)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            for key, stored_at, vector in zip(data['keys'], data['stored_at'], data['vectors']):
+                if not self._expired(float(stored_at), time.time()):
+                    self.put(str(key), vector, stored_at=float(stored_at))
+        return len(self)
+
+# --- Answer cache ---
+class AnswerCache:
+    # In-memory LRU in front of an optional SQLite table. Entries are tagged with
+    # the artifact version, so rebuilding the embeddings invalidates old answers.
+    def __init__(self, maxsize=1024, ttl=None, db_path=None, version=""):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.version = None
+        self.db_hits = 0
+        self.db = None
+        self._lock = threading.Lock()
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS answers "
+                "(key TEXT PRIMARY KEY, version TEXT, stored_at REAL, value TEXT)"
+            )
+            self.db.commit()
+        self.set_version(version)
+        self.purge()
+
+    @staticmethod
+    def make_key(question, hits, image_hash=None):
+        # Same normalized question + same retrieved chunks + same image => same prompt
+        fingerprint = {
+            "question": normalize_question(question),
+            "hits": {source: [int(i) for i in ids] for source, ids in hits.items()},
+            "image": image_hash,
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def set_version(self, version):
+        # In memory only: get() filters rows on the version, purge() deletes them
+        if version == self.version:
+            return False
+        self.version = version
+        self.memory.clear()
+        return True
+
+    def purge(self):
+        # Drops rows of other versions or past the TTL (blocking SQLite write)
+        if self.db is not None:
+            expired_before = time.time() - self.ttl if self.ttl is not None else 0
+            with self._lock:
+                self.db.execute("DELETE FROM answers WHERE version != ? OR stored_at < ?",
+                                (self.version, expired_before))
+                self.db.commit()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self.db is None:
+            return value
+        with self._lock:
+            row = self.db.execute(
+                "SELECT stored_at, value FROM answers WHERE key = ? AND version = ?",
+                (key, self.version),
+            ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[0] > self.ttl):
+            return None
+        value = json.loads(row[1])
+        self.db_hits += 1
+        self.memory.put(key, value, stored_at=row[0])
+        return value
+
+    def put(self, key, value):
+        stored_at = time.time()
+        self.memory.put(key, value, stored_at=stored_at)
+        if self.db is not None:
+            with self._lock:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO answers (key, version, stored_at, value) VALUES (?, ?, ?, ?)",
+                    (key, self.version, stored_at, json.dumps(value, ensure_ascii=False)),
+                )
+                self.db.commit()
+
+    def stats(self):
+        stats = {**self.memory.stats(), "db_hits": self.db_hits, "version": self.version}
+        if self.db is not None:
+            with self._lock:
+                stats["persisted"] = self.db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return stats
+
+# --- Semantic cache ---
+class SemanticCache:
+    # Past question embeddings in a small in-memory matrix; a new question whose
+    # cosine similarity to a cached one clears the threshold reuses its answer.
+    def __init__(self, dim, maxsize=512, threshold=0.92, ttl=None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self.values = [None] * maxsize
+        self.stored_at = np.zeros(maxsize)
+        self.last_used = np.zeros(maxsize)
+        self.used = np.zeros(maxsize, dtype=bool)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return int(self.used.sum())
+
+    def _live(self, now):
+        live = self.used.copy()
+        if self.ttl is not None:
+            live &= now - self.stored_at <= self.ttl
+        return live
+
+    def lookup(self, embedding):
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.time()
+        with self._lock:
+            live = self._live(now)
+            if live.any():
+                sims = np.where(live, self.vectors @ query, -np.inf)
+                slot = int(np.argmax(sims))
+                if sims[slot] >= self.threshold:
+                    self.last_used[slot] = now
+                    self.hits += 1
+                    return self.values[slot], float(sims[slot])
+            self.misses += 1
+            return None, None
+
+    def put(self, embedding, value):
+        vector = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            free = np.flatnonzero(~self._live(now))
+            # Reuse an empty/expired slot, else evict the least recently used entry
+            slot = int(free[0]) if len(free) else int(np.argmin(self.last_used))
+            self.vectors[slot] = vector / (np.linalg.norm(vector) or 1.0)
+            self.values[slot] = value
+            self.stored_at[slot] = self.last_used[slot] = now
+            self.used[slot] = True
+
+    def clear(self):
+        with self._lock:
+            self.used[:] = False
+            self.values = [None] * self.maxsize
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "semantic_hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from PIL import Image
+from caches import LRUCache
+from image_ingest import load_image
+
+# --- Config ---
+CAPTION_CACHE_DB = os.getenv("CAPTION_CACHE_DB", './caption_cache.sqlite')
+LEGACY_CAPTION_CACHE = './caption_cache.json'  # path-keyed cache written by generate_captions.py
+CAPTION_LOG = './caption_cache.log.jsonl'  # path-keyed captions appended since the last compaction
+COMPACT_EVERY = 200
+MEMORY_TIER_SIZE = 1024
+
+# --- Helpers ---
+def image_hash(image: Image.Image) -> str:
+    # Hash of the decoded pixels: the same screenshot re-encoded or re-uploaded
+    # under another name still maps to one entry
+    image = image.convert("RGB")
+    digest = hashlib.sha256(f"{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def prepare_image(data: bytes):
+    # The image as it is sent to Gemini (bounded decode, downscaled to
+    # TARGET_IMAGE_SIZE) and its cache key. The server and the offline scripts
+    # both go through here, so large images get the same key everywhere.
+    image = load_image(data)
+    return image, image_hash(image)
+
+def local_path(path):
+    # The legacy cache was written on Windows ("images\\post4_img0.png")
+    return path.replace("\\", "/")
+
+# --- Cache ---
+class CaptionCache:
+    # Bounded in-memory tier in front of a persistent SQLite tier, shared by
+    # the API server and the offline captioning pipeline
+    def __init__(self, db_path=CAPTION_CACHE_DB, memory_size=MEMORY_TIER_SIZE):
+        self.memory = LRUCache(maxsize=memory_size)
+        self.db_hits = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS captions "
+            "(hash TEXT PRIMARY KEY, caption TEXT, created_at REAL)"
+        )
+        self.db.commit()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        caption = self.memory.get(key)
+        if caption is not None:
+            return caption
+        with self._lock:
+            row = self.db.execute("SELECT caption FROM captions WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db_hits += 1
+        self.memory.put(key, row[0])
+        return row[0]
+
+    def put(self, key, caption):
+        self.memory.put(key, caption)
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO captions (hash, caption, created_at) VALUES (?, ?, ?)",
+                (key, caption, time.time()),
+            )
+            self.db.commit()
+
+    def stats(self):
+        with self._lock:
+            persisted = self.db.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+        return {**self.memory.stats(), "db_hits": self.db_hits, "persisted": persisted}
+
+# --- Path-keyed captions for the offline pipeline ---
+def load_path_captions(snapshot=LEGACY_CAPTION_CACHE, log=CAPTION_LOG):
+    captions = {}
+    if os.path.exists(snapshot):
+        with open(snapshot, 'r', encoding='utf-8') as f:
+            try:
+                captions = json.load(f)
+            except json.JSONDecodeError:
+                print("⚠️ Warning: Cache file was empty or corrupted, starting fresh.")
+    if os.path.exists(log):
+        with open(log, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted run
+                captions[entry["path"]] = entry["caption"]
+    return captions
+
+
+class PathCaptionLog:
+    # New captions are appended to a JSONL log, one line each, and folded into
+    # the JSON snapshot every `compact_every` entries, instead of rewriting the
+    # whole snapshot per caption
+    def __init__(self, snapshot=LEGACY_CAPTION_CACHE, log=CAPTION_LOG, compact_every=COMPACT_EVERY):
+        self.snapshot = snapshot
+        self.log = log
+        self.compact_every = compact_every
+        self.captions = load_path_captions(snapshot, log)
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._file = open(log, 'a', encoding='utf-8')
+
+    def __contains__(self, path):
+        return path in self.captions
+
+    def get(self, path):
+        return self.captions.get(path)
+
+    def put(self, path, caption):
+        with self._lock:
+            self.captions[path] = caption
+            self._file.write(json.dumps({"path": path, "caption": caption}, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.pending += 1
+            if self.pending >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        # Snapshot first, then truncate: a crash in between only replays entries twice
+        tmp_path = self.snapshot + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.captions, f, indent=2)
+        os.replace(tmp_path, self.snapshot)
+        self._file.close()
+        self._file = open(self.log, 'w', encoding='utf-8')
+        self.pending = 0
+
+    def close(self):
+        with self._lock:
+            self._compact()
+            self._file.close()
+
+# --- Seed from the legacy path-keyed cache ---
+def seed_from_legacy(cache, legacy_file=LEGACY_CAPTION_CACHE):
+    path_captions = load_path_captions(legacy_file)
+    added = 0
+    for path, caption in path_captions.items():
+        path = local_path(path)
+        if not caption or not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                _, key = prepare_image(f.read())
+        except Exception as e:
+            print(f"⚠️ Could not hash {path}: {e}")
+            continue
+        if cache.get(key) is None:
+            cache.put(key, caption)
+            added += 1
+    return added
+
+if __name__ == "__main__":
+    cache = CaptionCache()
+    print(f"✅ Seeded {seed_from_legacy(cache)} captions into {CAPTION_CACHE_DB}")
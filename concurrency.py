@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from starlette.responses import StreamingResponse
+
+# --- Admission control ---
+class Saturated(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    # Counts in-flight requests on the event loop and rejects new ones once the
+    # limit is reached, instead of letting them queue without bound
+    def __init__(self, max_inflight):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_acquire(self):
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            return False
+        self.inflight += 1
+        self.admitted += 1
+        self.peak = max(self.peak, self.inflight)
+        return True
+
+    def release(self):
+        self.inflight -= 1
+
+    @contextmanager
+    def slot(self):
+        if not self.try_acquire():
+            raise Saturated(f"{self.inflight} requests in flight (limit {self.max_inflight})")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "peak": self.peak,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    # Streams a body under a slot already taken with try_acquire(). The slot is
+    # released when the ASGI call returns, so a client that disconnects before
+    # the first chunk (the body generator never starts) does not leak it
+    def __init__(self, content, limiter, **kwargs):
+        super().__init__(content, **kwargs)
+        self.limiter = limiter
+        self.released = False
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.limiter.release()
@@ -0,0 +1,69 @@
+import os
+import hashlib
+import numpy as np
+from encoder import ENCODER_BACKEND
+
+# --- Helpers ---
+def content_hash(text, model_name, backend=ENCODER_BACKEND):
+    # The model and backend are part of the key: switching either (ONNX and
+    # int8 vectors differ slightly from PyTorch's) must re-encode everything
+    digest = hashlib.sha256(model_name.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(backend.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+# --- Store ---
+class ContentEmbeddings:
+    # Persistent content-hash -> embedding map for the offline build scripts:
+    # unchanged texts reuse their stored vector, only new or edited ones are encoded
+    def __init__(self, path, model_name, backend=ENCODER_BACKEND):
+        self.path = path
+        self.model_name = model_name
+        self.backend = backend
+        self.vectors = {}
+        self.reused = 0
+        self.encoded = 0
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                self.vectors = dict(zip(data["hashes"].tolist(), data["embeddings"]))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def seed(self, texts, embeddings):
+        # Adopt vectors from an existing artifact built with the same model and backend
+        for text, embedding in zip(texts, embeddings):
+            self.vectors.setdefault(content_hash(text, self.model_name, self.backend), embedding)
+
+    def encode(self, texts, encoder):
+        # texts may be a lazy iterable: new or changed texts go to encoder.add()
+        # as they arrive, so encoding overlaps with whatever produces them
+        hashes, missing = [], {}
+        for text in texts:
+            h = content_hash(text, self.model_name, self.backend)
+            hashes.append(h)
+            if h not in self.vectors and h not in missing:
+                missing[h] = text
+                encoder.add(text)
+        self.reused += len(hashes) - len(missing)
+        self.encoded += len(missing)
+        if missing:
+            self.vectors.update(zip(missing, encoder.finish()))
+        return hashes, np.stack([self.vectors[h] for h in hashes]) if hashes else np.empty((0, 0), np.float32)
+
+    def prune(self, keep):
+        # Drop vectors for texts that were edited or deleted since the last run
+        keep = set(keep)
+        dropped = [h for h in self.vectors if h not in keep]
+        for h in dropped:
+            del self.vectors[h]
+        return len(dropped)
+
+    def save(self):
+        hashes = list(self.vectors)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, hashes=np.array(hashes, dtype="U64"),
+                 embeddings=np.stack([self.vectors[h] for h in hashes]) if hashes else np.empty((0, 0), np.float32))
+        os.replace(tmp_path, self.path)
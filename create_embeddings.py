@@ -1,56 +1,96 @@
+import os
+import sys
 import json
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from functools import partial
+from multiprocessing import Pool
 from tqdm import tqdm
+from build_search_index import build_search_index, load_forum_corpus
+from content_embeddings import ContentEmbeddings
+from encoder import ENCODER_MODEL
+from html_text import TextCache, post_source, post_text, source_hash
+from parallel_encode import BUILD_WORKERS, ShardedEncoder
 
 # --- Config ---
 INPUT_FILE = './tds_forum_data/tds_all_posts_with_image_captions.json'
 OUTPUT_NPZ_FILE = './tds_forum_data/tds_embeddings_with_metadata.npz'
-EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
-
-# --- Load Posts ---
-with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-    posts = json.load(f)
-
-# --- Load Model ---
-model = SentenceTransformer(EMBEDDING_MODEL)
-
-# --- Prepare Texts and Metadata ---
-texts = []
-metadata = []
-
-for post in posts:
-    html = post.get("cooked_html", "").strip()
-    captions = post.get("image_captions", [])
-
-    # Use cooked_html_with_captions if available, else compose manually
-    if "cooked_html_with_captions" in post:
-        text = post["cooked_html_with_captions"].strip()
-    else:
-        caption_text = "\n".join(captions).strip()
-        text = html
-        if caption_text:
-            text += "\n" + caption_text
-
-    if text:
-        texts.append(text)
-        metadata.append({
-            "topic_id": post.get("topic_id"),
-            "title": post.get("title"),
-            "username": post.get("username"),
-            "created_at": post.get("created_at"),
-            "text": text,
-        })
-
-# --- Generate Embeddings ---
-print(f"🔍 Generating embeddings for {len(texts)} posts...")
-embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-
-# --- Save to .npz ---
-np.savez_compressed(
-    OUTPUT_NPZ_FILE,
-    embeddings=embeddings,
-    metadata=np.array(metadata, dtype=object)
-)
-
-print(f"✅ Saved embeddings and metadata to: {OUTPUT_NPZ_FILE}") 
\ No newline at end of file
+EMBEDDING_MODEL = ENCODER_MODEL
+EMBEDDING_STORE_FILE = './tds_forum_data/post_embedding_store.npz'  # content hash -> embedding
+FULL_REBUILD = "--full" in sys.argv  # re-encode every post instead of reusing stored vectors
+PREPARE_CHUNKSIZE = 64  # posts per task sent to a preprocessing worker
+
+# --- Helpers ---
+def cached_posts(posts, text_cache):
+    # (post hash, post, cached text or None): unchanged posts skip HTML parsing
+    for post in posts:
+        key = source_hash(*post_source(post))
+        yield key, post, text_cache.get(key)
+
+def prepare_post(item):
+    key, post, text = item
+    if text is None:
+        text = post_text(post)  # markup stripped; code blocks and captions kept
+    if not text:
+        return key, None, None
+    return key, text, {
+        "topic_id": post.get("topic_id"),
+        "title": post.get("title"),
+        "username": post.get("username"),
+        "created_at": post.get("created_at"),
+        "text": text,
+    }
+
+def embed_posts(posts, mapper=map):
+    # posts: iterable consumed lazily, prepared through mapper (map or a pool's
+    # imap); only new or changed posts are encoded, while later posts are still
+    # being prepared
+    text_cache = TextCache()
+    store = ContentEmbeddings(EMBEDDING_STORE_FILE, EMBEDDING_MODEL)
+    if FULL_REBUILD:
+        store.prune([])
+    elif not len(store) and os.path.exists(OUTPUT_NPZ_FILE):
+        # First incremental run: adopt the vectors of the last full build
+        previous_embeddings, previous_records = load_forum_corpus()
+        store.seed([record["text"] for record in previous_records], previous_embeddings)
+
+    metadata = []
+    keys = []
+
+    def texts():
+        for key, text, meta in mapper(prepare_post, cached_posts(posts, text_cache)):
+            text_cache.put(key, text or "")
+            keys.append(key)
+            if text:
+                metadata.append(meta)
+                yield text
+
+    print("🔍 Embedding new or changed posts...")
+    with ShardedEncoder("forum", model_name=EMBEDDING_MODEL, full=FULL_REBUILD) as encoder:
+        hashes, embeddings = store.encode(texts(), encoder)
+    dropped = store.prune(hashes)
+    store.save()
+    text_cache.prune(keys)
+    text_cache.save()
+    print(f"🧹 Text extraction: {text_cache.hits} posts cached, {text_cache.misses} parsed")
+    print(f"♻️ Reused {store.reused} stored embeddings, encoded {store.encoded}, dropped {dropped} stale")
+
+    np.savez_compressed(
+        OUTPUT_NPZ_FILE,
+        embeddings=embeddings,
+        metadata=np.array(metadata, dtype=object)
+    )
+    print(f"✅ Saved embeddings and metadata to: {OUTPUT_NPZ_FILE}")
+
+    # Rebuild merged search index
+    build_search_index()
+
+# --- Main ---
+def run():
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        posts = json.load(f)
+    # Posts are prepared in a process pool and stream into the encoder as they come back
+    with Pool(BUILD_WORKERS) as pool:
+        embed_posts(posts, partial(pool.imap, chunksize=PREPARE_CHUNKSIZE))
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,111 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rate_limit import TokenBucket
+
+# --- Config ---
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# --- Session ---
+def pooled_session(pool_size, retries=5):
+    # Keep-alive connections for pool_size threads; 429s and 5xx responses are
+    # retried with exponential backoff, honouring Retry-After
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=("GET",), respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# --- Client ---
+class DiscourseClient:
+    # One pooled session shared by a bounded set of worker threads; every
+    # request takes a token from a shared bucket
+    def __init__(self, base_url, headers=None, cookies=None, concurrency=8, rate=4.0, retries=5, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate)
+        self.session = pooled_session(concurrency, retries)
+        self.session.headers.update(headers or {})
+        self.session.cookies.update(cookies or {})
+        self.status_counts = {}
+        self.invalid_json = 0
+        self._lock = threading.Lock()
+
+    def get_json(self, path, etag=None):
+        # Returns (status, data, etag); a 304 means the cached copy is still current
+        self.bucket.acquire()
+        headers = {"If-None-Match": etag} if etag else None
+        try:
+            res = self.session.get(self.base_url + path, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️ {path}: {e}")
+            return None, None, None
+        with self._lock:
+            self.status_counts[res.status_code] = self.status_counts.get(res.status_code, 0) + 1
+        if res.status_code == 304:
+            return 304, None, etag
+        if res.status_code != 200:
+            return res.status_code, None, None
+        try:
+            data = res.json()
+        except ValueError:
+            # A 200 that is not JSON (e.g. an HTML login page) fails like a
+            # network error, so the topic is not checkpointed and is retried next run
+            with self._lock:
+                self.invalid_json += 1
+            print(f"⚠️ {path}: 200 response is not JSON")
+            return None, None, None
+        return 200, data, res.headers.get("ETag")
+
+    def map(self, fn, items):
+        # Runs fn over items on `concurrency` threads, yielding results as they finish
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(fn, item) for item in items]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def stats(self):
+        return {"requests": dict(sorted(self.status_counts.items())), "invalid_json": self.invalid_json,
+                **self.bucket.stats()}
+
+# --- Checkpoint ---
+class Checkpoint:
+    # Per-topic state of the last successful fetch (bumped_at, posts_count,
+    # ETag), written atomically so an interrupted scrape resumes where it stopped
+    def __init__(self, path):
+        self.path = path
+        self.topics = {}
+        self.dirty = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.topics = json.load(f).get("topics", {})
+
+    def get(self, topic_id):
+        with self._lock:
+            return dict(self.topics.get(str(topic_id), {}))
+
+    def update(self, topic_id, **fields):
+        with self._lock:
+            self.topics[str(topic_id)] = {**self.topics.get(str(topic_id), {}), **fields}
+            self.dirty += 1
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"topics": self.topics}, indent=2)
+            self.dirty = 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
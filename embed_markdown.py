@@ -1,18 +1,22 @@
 import os
+import sys
 import json
+import hashlib
 import numpy as np
+from artifacts import replace_file
+from multiprocessing import Pool
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
+from build_search_index import build_search_index
+from encoder import ENCODER_MODEL
+from parallel_encode import BUILD_WORKERS, ShardedEncoder
 
 # --- Config ---
 MARKDOWN_DIR = "tds_content"
 EMBEDDING_FILE = "course_embeddings.npz"
 CHUNKS_METADATA_FILE = "course_chunks.json"
+MANIFEST_FILE = "course_manifest.json"  # per-file hash, mtime and chunk ids of the last build
 CHUNK_SIZE = 500
-
-# --- Load model ---
-print("Loading embedding model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+FULL_REBUILD = "--full" in sys.argv  # re-chunk and re-embed every file
 
 # --- Helpers ---
 def chunk_text(text, max_len=500):
@@ -32,36 +36,101 @@ def clean_markdown(md_text):
     lines = [line for line in md_text.splitlines() if not line.strip().startswith("![]")]
     return "\n".join(lines)
 
-# --- Process all .md files ---
-print(f"Scanning markdown files in: {MARKDOWN_DIR}")
-all_chunks = []
-chunk_meta = []
-for filename in tqdm(os.listdir(MARKDOWN_DIR)):
-    if filename.endswith(".md"):
-        path = os.path.join(MARKDOWN_DIR, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
+def file_sha256(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def load_previous_build():
+    # Last build's chunks grouped by file: {filename: [(text, embedding, meta)]}
+    manifest = {"files": {}}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    if FULL_REBUILD or manifest.get("model", ENCODER_MODEL) != ENCODER_MODEL \
+            or manifest.get("chunk_size", CHUNK_SIZE) != CHUNK_SIZE \
+            or not (os.path.exists(EMBEDDING_FILE) and os.path.exists(CHUNKS_METADATA_FILE)):
+        return {"files": {}}, {}
+    with np.load(EMBEDDING_FILE) as data:
+        embeddings, texts = data["embeddings"], data["texts"]
+    with open(CHUNKS_METADATA_FILE, "r", encoding="utf-8") as f:
+        metas = json.load(f)
+    by_file = {}
+    for text, embedding, meta in zip(texts, embeddings, metas):
+        by_file.setdefault(meta["file"], []).append((str(text), embedding, meta))
+    return manifest, by_file
+
+def read_and_chunk(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return file_sha256(content), chunk_text(clean_markdown(content), max_len=CHUNK_SIZE)
+
+# --- Main ---
+def run():
+    print(f"Scanning markdown files in: {MARKDOWN_DIR}")
+    manifest, previous = load_previous_build()
+    files = {}  # filename -> manifest entry
+    file_chunks = {}  # filename -> [(text, embedding or None)]
+    reused_files = []
+
+    # Same mtime and size: trust the manifest without reading the file
+    to_read = []
+    for filename in sorted(os.listdir(MARKDOWN_DIR)):
+        if not filename.endswith(".md"):
+            continue
+        stat = os.stat(os.path.join(MARKDOWN_DIR, filename))
+        entry = manifest["files"].get(filename)
+        old_chunks = previous.get(filename, [])
+        if entry and old_chunks and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size):
+            files[filename] = entry
+            file_chunks[filename] = [(text, embedding) for text, embedding, _ in old_chunks]
+            reused_files.append(filename)
+        else:
+            files[filename] = {"mtime": stat.st_mtime, "size": stat.st_size}
+            to_read.append(filename)
+
+    # The rest are read and chunked in a process pool; chunks of changed files
+    # stream into the encoder while later files are still being chunked
+    with ShardedEncoder("course", full=FULL_REBUILD) as encoder, Pool(BUILD_WORKERS) as pool:
+        paths = [os.path.join(MARKDOWN_DIR, filename) for filename in to_read]
+        for filename, (sha, chunks) in zip(to_read, tqdm(pool.imap(read_and_chunk, paths), total=len(paths))):
+            files[filename].update(sha256=sha, chunks=[f"{filename}#{i}" for i in range(len(chunks))])
+            old_chunks = previous.get(filename, [])
+            # Touched but unchanged (or first incremental run): the chunks still match the last build
+            if chunks == [text for text, _, _ in old_chunks]:
+                file_chunks[filename] = [(text, embedding) for text, embedding, _ in old_chunks]
+                reused_files.append(filename)
+            else:
+                file_chunks[filename] = [(chunk, None) for chunk in chunks]
+                for chunk in chunks:
+                    encoder.add(chunk)
 
-        content = clean_markdown(content)
-        chunks = chunk_text(content, max_len=CHUNK_SIZE)
+        deleted = sorted(set(previous) - set(files))
+        print(f"Reusing {len(reused_files)} files, re-embedding {len(files) - len(reused_files)} "
+              f"({encoder.count} chunks), dropping {len(deleted)} deleted")
+        encoded = iter(encoder.finish())
 
-        for chunk in chunks:
-            all_chunks.append(chunk)
+    all_chunks, embeddings, chunk_meta = [], [], []
+    for filename in sorted(file_chunks):
+        for i, (text, embedding) in enumerate(file_chunks[filename]):
+            all_chunks.append(text)
+            embeddings.append(next(encoded) if embedding is None else embedding)
             chunk_meta.append({
+                "id": f"{filename}#{i}",
                 "file": filename,
-                "chunk": chunk[:200].strip() + "...",
+                "chunk": text[:200].strip() + "...",
             })
 
-# --- Embed chunks ---
-print(f"Embedding {len(all_chunks)} chunks...")
-embeddings = model.encode(all_chunks)
+    # Save to disk, each file swapped in whole (manifest last: it only describes outputs that exist)
+    replace_file(EMBEDDING_FILE, lambda f: np.savez_compressed(f, embeddings=np.array(embeddings),
+                                                              texts=np.array(all_chunks)))
+    replace_file(CHUNKS_METADATA_FILE,
+                 lambda f: f.write(json.dumps(chunk_meta, indent=2).encode("utf-8")))
+    replace_file(MANIFEST_FILE, lambda f: f.write(json.dumps(
+        {"model": ENCODER_MODEL, "chunk_size": CHUNK_SIZE, "files": files}, indent=2).encode("utf-8")))
 
-# --- Save to disk ---
-np.savez_compressed(EMBEDDING_FILE,
-                    embeddings=np.array(embeddings),
-                    texts=np.array(all_chunks))
+    print(f"✅ Done. Chunks: {len(all_chunks)} → Saved to {EMBEDDING_FILE} + {CHUNKS_METADATA_FILE}")
 
-with open(CHUNKS_METADATA_FILE, "w", encoding="utf-8") as f:
-    json.dump(chunk_meta, f, indent=2)
+    # Rebuild merged search index
+    build_search_index()
 
-print(f"✅ Done. Chunks: {len(all_chunks)} → Saved to {EMBEDDING_FILE} + {CHUNKS_METADATA_FILE}") 
\ No newline at end of file
+if __name__ == "__main__":
+    run()
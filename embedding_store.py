@@ -0,0 +1,104 @@
+import numpy as np
+
+# --- Config ---
+STORE_DTYPES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 8192  # rows upcast at a time for float16/int8 stores
+
+# --- Helpers ---
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_indices(scores, k):
+    # argpartition is O(n); only the k survivors get sorted
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+def top_k_rows(scores, k):
+    # Row-wise top-k of a (queries x candidates) score matrix, best first
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.int64)
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+# --- Store ---
+# Vectors are normalized once when the store is built, so a cosine search is a
+# single matrix-vector dot product. int8 stores keep a per-row dequantization scale.
+class EmbeddingStore:
+    def __init__(self, vectors, scales=None):
+        self.vectors = np.ascontiguousarray(vectors)
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+        if self.dtype not in STORE_DTYPES:
+            raise ValueError(f"Unsupported store dtype '{self.dtype}', expected one of {STORE_DTYPES}")
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype.name
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @classmethod
+    def from_embeddings(cls, embeddings, dtype="float32"):
+        vectors = normalize(embeddings)
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+            return cls(quantized, scales)
+        return cls(vectors.astype(dtype))
+
+    def _dot(self, vectors, query):
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def scores(self, query_embedding, ids=None):
+        query = normalize(query_embedding)
+        vectors = self.vectors if ids is None else self.vectors[ids]
+        scores = self._dot(vectors, query)
+        if self.scales is not None:
+            scores *= self.scales if ids is None else self.scales[ids]
+        return scores
+
+    def scores_batch(self, query_embeddings):
+        # One matrix-matrix product for a batch of queries: (queries x rows)
+        queries = normalize(query_embeddings)
+        if self.vectors.dtype == np.float32:
+            scores = queries @ self.vectors.T
+        else:
+            scores = np.empty((len(queries), len(self.vectors)), dtype=np.float32)
+            for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+                block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+                scores[:, start:start + len(block)] = queries @ block.astype(np.float32).T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def top_k(self, query_embedding, k=3):
+        return top_k_indices(self.scores(query_embedding), k)
+
+    def to_arrays(self):
+        arrays = {"vectors": self.vectors}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["vectors"], arrays.get("scales"))
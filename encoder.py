@@ -0,0 +1,111 @@
+import os
+import numpy as np
+from artifacts import ARTIFACT_DIR, read_manifest, write_manifest
+from embedding_store import normalize
+
+# --- Config ---
+ENCODER_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")  # "torch", "onnx" or "onnx-int8"
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_MODEL_DIR = os.path.join(ARTIFACT_DIR, 'encoder_onnx')
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # intra-op threads per session; 0 lets onnxruntime decide
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+TOKENIZER_FILE = 'tokenizer.json'
+
+# --- Export (needs torch; run once at build time) ---
+def export_onnx(directory=ONNX_MODEL_DIR, model_name=ENCODER_MODEL):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    os.makedirs(directory, exist_ok=True)
+    tokenizer.backend_tokenizer.save(os.path.join(directory, TOKENIZER_FILE))
+
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    model_path = os.path.join(directory, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(transformer, tuple(sample[name] for name in input_names), model_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+    # int8 weights, activations quantized on the fly: smaller and faster on CPU
+    quantize_dynamic(model_path, os.path.join(directory, ONNX_FILES["onnx-int8"]), weight_type=QuantType.QInt8)
+
+    return write_manifest(directory, model=model_name, dim=st_model.get_sentence_embedding_dimension(),
+                          max_seq_length=st_model.max_seq_length, pad_token=tokenizer.pad_token)
+
+# --- ONNX Runtime encoder ---
+class OnnxEncoder:
+    # Same encode() contract as SentenceTransformer for this model (mean pooling
+    # over the attention mask, then L2 normalization), without importing torch
+    def __init__(self, directory=ONNX_MODEL_DIR, backend="onnx"):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        manifest = read_manifest(directory)
+        self.backend = backend
+        self.dim = manifest["dim"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_token=manifest["pad_token"],
+                                      pad_id=self.tokenizer.token_to_id(manifest["pad_token"]))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(os.path.join(directory, ONNX_FILES[backend]), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(["last_hidden_state"],
+                                  {k: v for k, v in inputs.items() if k in self.input_names})[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return normalize(pooled)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        # Longest first, so each batch pads to similar lengths
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        embeddings = np.empty((len(sentences), self.dim), dtype=np.float32)
+        starts = range(0, len(sentences), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            starts = tqdm(starts, desc="Batches")
+        for start in starts:
+            ids = order[start:start + batch_size]
+            embeddings[ids] = self._encode_batch([sentences[i] for i in ids])
+        return embeddings[0] if single else embeddings
+
+# --- Loading ---
+def load_encoder(backend=ENCODER_BACKEND, model_name=ENCODER_MODEL):
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {ENCODER_BACKENDS}")
+    if backend != "torch":
+        try:
+            return OnnxEncoder(ONNX_MODEL_DIR, backend)
+        except Exception as e:
+            print(f"⚠️ {backend} encoder unavailable ({e}); falling back to PyTorch")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+if __name__ == "__main__":
+    manifest = export_onnx()
+    print(f"✅ Exported {manifest['model']} to {ONNX_MODEL_DIR} ({', '.join(ONNX_FILES.values())})")
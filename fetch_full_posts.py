@@ -1,10 +1,10 @@
 import os
 import json
-import time
-import requests
-from bs4 import BeautifulSoup
+from discourse_client import Checkpoint, DiscourseClient
+from html_text import html_to_text
 
 # --- CONFIGURATION ---
+BASE_URL = os.getenv("DISCOURSE_URL", "https://discourse.onlinedegree.iitm.ac.in")
 COOKIES = {
     '_t': '',  # paste your _t cookie value here
     '_forum_session': '',  # paste your _forum_session cookie here if needed
@@ -14,48 +14,71 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0',
     'Accept': 'application/json'
 }
+CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+RATE_LIMIT = float(os.getenv("SCRAPE_RATE_LIMIT", "4"))  # requests per second
+SAVED_TOPICS_DIR = 'tds_topics'  # directory where your topic summaries are saved
+OUTPUT_DIR = 'full_posts'
+CHECKPOINT_FILE = os.path.join(OUTPUT_DIR, 'checkpoint.json')
 
-# --- DIRECTORY SETUP ---
-os.makedirs('full_posts', exist_ok=True)
-
-# --- FETCH FULL POST CONTENT ---
-saved_topics_dir = 'tds_topics'  # directory where your topic summaries are saved
-files = [f for f in os.listdir(saved_topics_dir) if f.startswith('topic_') and f.endswith('.json')]
-
-for fname in files:
-    with open(os.path.join(saved_topics_dir, fname), 'r', encoding='utf-8') as f:
-        topic_data = json.load(f)
-        topic_id = topic_data['id']
-        topic_title = topic_data['title']
-        topic_slug = topic_data.get('slug')
-        if not topic_slug:
-            print(f"[!] Skipping topic {topic_id} as slug is missing")
+# --- Helpers ---
+def load_topic_summaries():
+    summaries = []
+    for fname in sorted(os.listdir(SAVED_TOPICS_DIR)):
+        if not (fname.startswith('topic_') and fname.endswith('.json')):
+            continue
+        with open(os.path.join(SAVED_TOPICS_DIR, fname), 'r', encoding='utf-8') as f:
+            topic_data = json.load(f)
+        if not topic_data.get('slug'):
+            print(f"[!] Skipping topic {topic_data['id']} as slug is missing")
             continue
+        summaries.append(topic_data)
+    return summaries
 
-    print(f"[+] Fetching topic {topic_id}: {topic_title}")
+def save_path(topic_id):
+    return os.path.join(OUTPUT_DIR, f'topic_{topic_id}.md')
 
-    topic_url = f"https://discourse.onlinedegree.iitm.ac.in/t/{topic_slug}/{topic_id}.json"
-    resp = requests.get(topic_url, headers=HEADERS, cookies=COOKIES)
+def is_current(topic_data, checkpoint):
+    state = checkpoint.get(topic_data['id'])
+    return (os.path.exists(save_path(topic_data['id']))
+            and state.get('bumped_at') == topic_data.get('bumped_at')
+            and state.get('posts_count') == topic_data.get('posts_count'))
 
-    if resp.status_code != 200:
-        print(f"[!] Failed to fetch topic {topic_id}, status: {resp.status_code}")
-        continue
+def fetch_topic(client, checkpoint, topic_data):
+    topic_id, topic_title = topic_data['id'], topic_data['title']
+    etag = checkpoint.get(topic_id).get('etag') if os.path.exists(save_path(topic_id)) else None
+    status, topic_json, etag = client.get_json(f"/t/{topic_data['slug']}/{topic_id}.json", etag=etag)
+    if status == 200:
+        posts = topic_json.get('post_stream', {}).get('posts', [])
 
-    topic_json = resp.json()
-    posts = topic_json.get('post_stream', {}).get('posts', [])
+        # Save cleaned content to markdown file
+        markdown_lines = [f"# {topic_title}\n"]
+        for post in posts:
+            markdown_lines.append(html_to_text(post.get('cooked', '')))
+            markdown_lines.append('\n---\n')
 
-    # Save cleaned content to markdown file
-    markdown_lines = [f"# {topic_title}\n"]
-    for post in posts:
-        raw_html = post.get('cooked', '')
-        soup = BeautifulSoup(raw_html, 'html.parser')
-        text = soup.get_text().strip()
-        markdown_lines.append(text)
-        markdown_lines.append('\n---\n')
+        with open(save_path(topic_id), 'w', encoding='utf-8') as f_out:
+            f_out.write('\n'.join(markdown_lines))
+    elif status != 304:
+        print(f"[!] Failed to fetch topic {topic_id}, status: {status}")
+        return
+    checkpoint.update(topic_id, bumped_at=topic_data.get('bumped_at'),
+                      posts_count=topic_data.get('posts_count'), etag=etag)
+
+# --- FETCH FULL POST CONTENT ---
+def fetch_all():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    client = DiscourseClient(BASE_URL, headers=HEADERS, cookies=COOKIES, concurrency=CONCURRENCY, rate=RATE_LIMIT)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
 
-    save_path = os.path.join('full_posts', f'topic_{topic_id}.md')
-    with open(save_path, 'w', encoding='utf-8') as f_out:
-        f_out.write('\n'.join(markdown_lines))
+    summaries = load_topic_summaries()
+    changed = [t for t in summaries if not is_current(t, checkpoint)]
+    print(f"[+] Fetching {len(changed)} of {len(summaries)} topics")
+    try:
+        for _ in client.map(lambda t: fetch_topic(client, checkpoint, t), changed):
+            pass
+    finally:
+        checkpoint.save()
+    print(f"[+] Done: {client.stats()}")
 
-    print(f"     Saved: {save_path}")
-    time.sleep(0.5)  # be nice to the server
+if __name__ == "__main__":
+    fetch_all()
@@ -1,18 +1,18 @@
 import os
 import json
-import time
 import random
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from caption_cache import CaptionCache, PathCaptionLog, prepare_image
+from rate_limit import AdaptiveTokenBucket
 load_dotenv()
 
 # --- Config ---
 POSTS_JSON = './tds_forum_data/tds_all_posts_with_local_images.json'
-CAPTION_CACHE = './caption_cache.json'
-GEMINI_RATE_LIMIT = 30
-GEMINI_WAIT_TIME = 60.0 / GEMINI_RATE_LIMIT
+GEMINI_RATE_LIMIT = int(os.getenv("GEMINI_RATE_LIMIT", "30"))  # requests per minute
+CAPTION_WORKERS = int(os.getenv("CAPTION_WORKERS", "8"))  # concurrent Gemini calls
 MAX_ATTEMPTS = 5
 
 # --- Configure Gemini ---
@@ -20,81 +20,94 @@ print("🔑 Configuring Gemini...")
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 caption_model = genai.GenerativeModel("gemini-2.0-flash-lite")
 
-# --- Load posts ---
-print("📂 Loading posts...")
-with open(POSTS_JSON, 'r', encoding='utf-8') as f:
-    posts = json.load(f)
+# Every worker draws from one bucket, so the pool as a whole stays at the quota;
+# a 429 slows all of them down, successes ramp back up to GEMINI_RATE_LIMIT
+gemini_bucket = AdaptiveTokenBucket(GEMINI_RATE_LIMIT / 60.0)
 
-# --- Initialize or load caption cache ---
-if os.path.exists(CAPTION_CACHE):
-    with open(CAPTION_CACHE, 'r', encoding='utf-8') as f:
-        try:
-            caption_cache = json.load(f)
-        except json.JSONDecodeError:
-            print("⚠️ Warning: Cache file was empty or corrupted, starting fresh.")
-            caption_cache = {}
-else:
-    caption_cache = {}
+# Path-keyed captions (read by merge_captions_with_posts.py), appended to a log
+# and compacted into caption_cache.json periodically
+caption_cache = PathCaptionLog()
+
+# Content-hash cache shared with the API server: the same image under another
+# path (or already uploaded by a student) is captioned only once
+hash_cache = CaptionCache()
 
 # --- Caption generation function ---
+def is_rate_limit(error):
+    return "429" in str(error) or "quota" in str(error).lower()
+
 def generate_caption_with_gemini(local_path):
     if local_path in caption_cache:
-        return caption_cache[local_path]
+        return caption_cache.get(local_path)
 
     try:
-        image = Image.open(local_path).convert("RGB")
+        # Same decode and key as the API server, so both share cache entries
+        with open(local_path, 'rb') as f:
+            image, key = prepare_image(f.read())
     except Exception as e:
         print(f"❌ Could not open image {local_path}: {e}")
         return None
 
+    cached = hash_cache.get(key)
+    if cached is not None:
+        caption_cache.put(local_path, cached)
+        return cached
+
     for attempt in range(MAX_ATTEMPTS):
+        gemini_bucket.acquire()
         try:
             response = caption_model.generate_content([
                 "Describe this image in detail:",
                 image
             ])
             caption = response.text.strip()
-
-            # Save to cache
-            caption_cache[local_path] = caption
-            with open(CAPTION_CACHE, 'w', encoding='utf-8') as f:
-                json.dump(caption_cache, f, indent=2)
-
-            time.sleep(GEMINI_WAIT_TIME)
-            return caption
-
         except Exception as e:
-            if "429" in str(e) or "quota" in str(e).lower():
+            if is_rate_limit(e):
                 wait_time = 2 ** attempt + random.uniform(0, 1)
-                print(f"⚠️ Rate limit hit, retrying in {wait_time:.2f}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"❌ Caption generation failed for {local_path}: {e}")
-                break
+                print(f"⚠️ Rate limit hit, backing off {wait_time:.2f}s at {gemini_bucket.rate * 60:.1f}/min")
+                gemini_bucket.penalize(wait_time)
+                continue
+            print(f"❌ Caption generation failed for {local_path}: {e}")
+            return None
+
+        gemini_bucket.reward()
+        caption_cache.put(local_path, caption)
+        hash_cache.put(key, caption)
+        return caption
 
     return None
 
 # --- Process all posts ---
-print("🖼️ Starting caption generation for image posts...")
+def run():
+    print("📂 Loading posts...")
+    with open(POSTS_JSON, 'r', encoding='utf-8') as f:
+        posts = json.load(f)
 
-for i, post in tqdm(enumerate(posts), total=len(posts)):
-    image_paths = post.get("local_image_paths", [])
-    post_captions = []
+    paths = sorted({path for post in posts for path in post.get("local_image_paths", []) if path})
+    print(f"🖼️ Captioning {len(paths)} unique images on {CAPTION_WORKERS} workers "
+          f"at up to {GEMINI_RATE_LIMIT}/min...")
 
-    for img_path in image_paths:
-        print(f"➡️  Captioning {img_path}")
-        caption = generate_caption_with_gemini(img_path)
-        if caption:
-            post_captions.append(caption)
-            print(f"✅ {caption}")
-        else:
-            print(f"⚠️ Failed to caption {img_path}")
+    captions = {}
+    try:
+        with ThreadPoolExecutor(max_workers=CAPTION_WORKERS) as pool:
+            results = pool.map(lambda path: (path, generate_caption_with_gemini(path)), paths)
+            for path, caption in tqdm(results, total=len(paths)):
+                if caption:
+                    captions[path] = caption
+                else:
+                    print(f"⚠️ Failed to caption {path}")
+    finally:
+        caption_cache.close()  # compact the log into caption_cache.json
 
     # Optional: store captions in post object for downstream use
-    post['image_captions'] = post_captions
+    for post in posts:
+        post['image_captions'] = [captions.get(path, "") for path in post.get("local_image_paths", [])]
+
+    # (Optional) Save posts with image_captions if needed
+    # with open('./tds_forum_data/tds_all_posts_with_captions.json', 'w', encoding='utf-8') as f:
+    #     json.dump(posts, f, ensure_ascii=False, indent=2)
 
-# (Optional) Save posts with image_captions if needed
-# with open('./tds_forum_data/tds_all_posts_with_captions.json', 'w', encoding='utf-8') as f:
-#     json.dump(posts, f, ensure_ascii=False, indent=2)
+    print(f"✅ All images processed and captioned. Gemini limiter: {gemini_bucket.stats()}")
 
-print("✅ All images processed and captioned.")
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import hashlib
+from html import escape
+from lxml import etree
+from lxml import html as lxml_html
+
+# --- Config ---
+EXTRACTOR_VERSION = 1  # bump when html_to_text changes: cached texts are discarded
+TEXT_CACHE_FILE = './tds_forum_data/post_text_cache.json'  # post hash -> extracted text
+
+# Discourse chrome that carries no content: lightbox file name/size, icons,
+# quote buttons, avatars, and whatever images were not replaced by captions
+DROP_XPATH = " | ".join(["//script", "//style", "//svg", "//img"] + [
+    f"//div[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]" for cls in ("meta", "quote-controls")])
+BLOCK_TAGS = ("p", "div", "br", "hr", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+              "blockquote", "aside", "header", "article", "table", "ul", "ol", "pre")
+CELL_TAGS = ("td", "th")
+CODE_MARK = "\ue000"  # private-use placeholder for code blocks while whitespace is normalized
+SPACES = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+# --- Parsing ---
+def fragment(html):
+    # Parses a cooked post body into one <div>; None if there is nothing to parse
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.fragment_fromstring(html, create_parent="div")
+    except (etree.ParserError, ValueError):
+        return None
+
+def serialize(root):
+    # Inverse of fragment(): the children's markup without the wrapping <div>
+    return escape(root.text or "", quote=False) + "".join(
+        etree.tostring(child, encoding="unicode", method="html") for child in root)
+
+def image_sources(html):
+    root = fragment(html)
+    return [img.get("src") for img in root.iter("img") if img.get("src")] if root is not None else []
+
+# --- Extraction ---
+def html_to_text(html):
+    # Plain text for embedding and prompts: markup, attributes and lightbox
+    # metadata are dropped; code blocks keep their layout (fenced), captions
+    # merged in as <em> survive as text
+    root = fragment(html)
+    if root is None:
+        return ""
+    for el in root.xpath(DROP_XPATH):
+        el.drop_tree()  # keeps the element's tail text
+
+    code_blocks = []
+    for pre in list(root.iter("pre")):
+        code_blocks.append(pre.text_content().strip("\n"))
+        for child in list(pre):
+            pre.remove(child)
+        pre.text = f"{CODE_MARK}{len(code_blocks) - 1}{CODE_MARK}"
+
+    # Source newlines are just whitespace outside <pre>; layout comes from the tags
+    for el in root.iter():
+        el.text = el.text and el.text.replace("\n", " ")
+        el.tail = el.tail and el.tail.replace("\n", " ")
+    for el in root.iter(BLOCK_TAGS):
+        el.tail = "\n" + (el.tail or "")
+        if el.tag == "li":
+            el.text = "- " + (el.text or "")
+    for el in root.iter(CELL_TAGS):
+        el.tail = " | " + (el.tail or "")
+
+    lines = (SPACES.sub(" ", line).strip() for line in root.text_content().split("\n"))
+    text = "\n".join(line for line in lines if line)
+    return re.sub(f"{CODE_MARK}(\\d+){CODE_MARK}", lambda m: f"```\n{code_blocks[int(m.group(1))]}\n```", text)
+
+# --- Cache ---
+def post_source(post):
+    # The HTML a post's text is extracted from, plus captions when they were
+    # not merged into the HTML
+    if "cooked_html_with_captions" in post:
+        return post["cooked_html_with_captions"], []
+    return post.get("cooked_html", ""), post.get("image_captions", [])
+
+def post_text(post):
+    html, captions = post_source(post)
+    parts = [html_to_text(html)] + [caption.strip() for caption in captions]
+    return "\n".join(part for part in parts if part)
+
+def source_hash(html, captions):
+    digest = hashlib.sha256(html.encode("utf-8"))
+    for caption in captions:
+        digest.update(b"\0")
+        digest.update(caption.encode("utf-8"))
+    return digest.hexdigest()
+
+class TextCache:
+    # Post hash -> extracted text for the offline build scripts, so unchanged
+    # posts skip parsing; written atomically, reset when EXTRACTOR_VERSION changes
+    def __init__(self, path=TEXT_CACHE_FILE):
+        self.path = path
+        self.texts = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == EXTRACTOR_VERSION:
+                self.texts = data.get("texts", {})
+
+    def get(self, key):
+        text = self.texts.get(key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        self.texts[key] = text
+
+    def prune(self, keep):
+        keep = set(keep)
+        for key in [k for k in self.texts if k not in keep]:
+            del self.texts[key]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": EXTRACTOR_VERSION, "texts": self.texts}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
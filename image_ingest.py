@@ -0,0 +1,58 @@
+import os
+import base64
+import binascii
+from io import BytesIO
+from PIL import Image
+
+# --- Config ---
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))  # encoded file size
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))  # width * height before downscaling
+TARGET_IMAGE_SIZE = int(os.getenv("TARGET_IMAGE_SIZE", "1024"))  # longest side sent to Gemini
+
+# --- Errors ---
+class ImageRejected(ValueError):
+    status_code = 400
+
+
+class ImageTooLarge(ImageRejected):
+    status_code = 413
+
+# --- Ingestion ---
+def decode_base64(image_b64: str) -> bytes:
+    # Reject oversized payloads from their encoded length, before allocating the decoded copy
+    if len(image_b64) * 3 // 4 > MAX_IMAGE_BYTES + 3:
+        raise ImageTooLarge(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+    try:
+        data = base64.b64decode(image_b64, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ImageRejected(f"Invalid base64 image: {e}")
+    check_size(data)
+    return data
+
+def check_size(data: bytes):
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageTooLarge(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+    if not data:
+        raise ImageRejected("Empty image")
+
+def open_image(data: bytes) -> Image.Image:
+    # Reads the header only: cheap enough to validate a request up front
+    try:
+        image = Image.open(BytesIO(data))
+    except Exception as e:
+        raise ImageRejected(f"Unreadable image: {e}")
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is {image.width}x{image.height}, over {MAX_IMAGE_PIXELS} pixels")
+    return image
+
+def load_image(data: bytes, target_size: int = TARGET_IMAGE_SIZE) -> Image.Image:
+    image = open_image(data)
+    try:
+        # JPEG decodes straight to a reduced scale; other formats decode at full size
+        image.draft("RGB", (target_size, target_size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((target_size, target_size))
+        return image.convert("RGB")
+    except Exception as e:
+        raise ImageRejected(f"Failed to decode image: {e}")
@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from artifacts import SEARCH_INDEX, RecordStore, current_build, read_manifest
+from vector_index import load_index
+
+# --- Generations ---
+@dataclass
+class Generation:
+    # One consistent set of serving artifacts. Requests hold on to the
+    # generation they started with, so a swap never changes it under them.
+    number: int
+    version: str  # index manifest created_at
+    index: object
+    records: dict
+    loaded_at: float = field(default_factory=time.time)
+
+
+class IndexManager:
+    # Loads the search index and record stores as a versioned generation and
+    # swaps in a new one when build_search_index.py publishes another build
+    def __init__(self, artifact_dir, nprobe=None, on_swap=None):
+        self.artifact_dir = artifact_dir
+        self.nprobe = nprobe
+        self.on_swap = on_swap
+        self.current = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_reload_ms = None
+        self.last_checked = None
+
+    def artifact_version(self):
+        return str(read_manifest(os.path.join(current_build(self.artifact_dir), SEARCH_INDEX))["created_at"])
+
+    def load(self):
+        # The build directory is resolved once: its index and records were
+        # written together and are never replaced in place
+        started = time.perf_counter()
+        build_dir = current_build(self.artifact_dir)
+        index = load_index(os.path.join(build_dir, SEARCH_INDEX), nprobe=self.nprobe)
+        version = str(index.manifest["created_at"])
+        records = {name: RecordStore(os.path.join(build_dir, name)) for name in index.source_names}
+        for name, size in zip(index.source_names, index.source_sizes):
+            if len(records[name]) != size:
+                raise ValueError(f"'{name}' has {len(records[name])} records for {size} vectors")
+        number = self.current.number + 1 if self.current else 1
+        generation = Generation(number, version, index, records)
+        return generation, (time.perf_counter() - started) * 1000
+
+    def swap(self, generation, load_ms):
+        self.current = generation
+        self.last_reload_ms = load_ms
+        if generation.number > 1:
+            self.reloads += 1
+        if self.on_swap:
+            self.on_swap(generation)
+        print(f"🔄 Serving index generation {generation.number} (version {generation.version}, "
+              f"loaded in {load_ms:.0f} ms)")
+
+    def changed(self):
+        self.last_checked = time.time()
+        try:
+            return self.current is not None and self.artifact_version() != self.current.version
+        except (FileNotFoundError, ValueError, KeyError):
+            return False  # mid-write or removed; look again next interval
+
+    async def watch(self, interval):
+        # Polls the published build's index manifest. Loading runs in
+        # a thread; the swap itself happens on the event loop.
+        while True:
+            await asyncio.sleep(interval)
+            if not self.changed():
+                continue
+            try:
+                generation, load_ms = await asyncio.to_thread(self.load)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"⚠️ Index reload failed: {e}")
+                continue
+            self.swap(generation, load_ms)
+
+    def stats(self):
+        generation = self.current
+        return {
+            "generation": generation.number if generation else None,
+            "version": generation.version if generation else None,
+            "loaded_at": generation.loaded_at if generation else None,
+            "sizes": dict(zip(generation.index.source_names, map(int, generation.index.source_sizes)))
+                     if generation else None,
+            "last_reload_ms": round(self.last_reload_ms, 1) if self.last_reload_ms is not None else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
@@ -1,44 +1,154 @@
 import os
+import asyncio
+import hashlib
 import json
-import base64
+import time
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from dataclasses import dataclass
 import numpy as np
-from io import BytesIO
-from typing import Optional
 from PIL import Image
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import google.generativeai as genai
 from dotenv import load_dotenv
+from artifacts import ARTIFACT_DIR
+from caption_cache import CaptionCache, prepare_image
+from index_manager import IndexManager
+from image_ingest import MAX_IMAGE_BYTES, ImageRejected, check_size, decode_base64, open_image
+from caches import AnswerCache, EmbeddingCache, SemanticCache, normalize_question
+from concurrency import AdmittedStreamingResponse, ConcurrencyLimiter, Saturated
+from encoder import load_encoder
+from micro_batcher import MicroBatcher
+from stage_timer import StageStats, StageTimer
+from startup import Startup
 
 load_dotenv()
 
 # --- Config ---
-FORUM_EMBED_FILE = './tds_forum_data/tds_embeddings_with_metadata.npz'
-COURSE_EMBED_FILE = './course_embeddings.npz'
-COURSE_CHUNKS_META = './course_chunks.json'
 TOP_K = 3
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "0")) or None  # recall-vs-latency knob for IVF
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "30"))  # seconds between artifact checks; 0 disables
+SEARCH_MODE = os.getenv("SEARCH_MODE", "per_source")  # "per_source" or "interleaved"
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))  # seconds
+QUERY_CACHE_FILE = os.getenv("QUERY_CACHE_FILE", "")  # e.g. ./query_cache.npz; empty disables persistence
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "21600"))  # seconds
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB", "")  # e.g. ./answer_cache.sqlite; empty keeps it in memory
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # 0 disables it
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "256"))  # beyond this /ask answers 429
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "64"))  # concurrent Gemini calls per worker
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "2"))  # threads dedicated to model.encode
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "")  # JSONL of asked questions, replayed by benchmark_semantic_cache.py
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "512"))  # questions per /ask_batch request
+BATCH_GENERATE_CONCURRENCY = int(os.getenv("BATCH_GENERATE_CONCURRENCY", "16"))  # Gemini calls in flight per batch
+ENCODE_BATCH_SIZE = 64
+ENCODE_MAX_BATCH_SIZE = int(os.getenv("ENCODE_MAX_BATCH_SIZE", "32"))  # questions per micro-batched encode
+ENCODE_MAX_WAIT_MS = float(os.getenv("ENCODE_MAX_WAIT_MS", "5"))  # how long a question waits for others to join
+
+# Corpus name -> prompt heading, interleaving weight and optional link template.
+# Order is the order sections appear in the prompt.
+CORPORA = {
+    "course": {"heading": "Course Material", "weight": 1.0},
+    "forum": {
+        "heading": "Forum Discussions",
+        "weight": 1.0,
+        "url": "https://discourse.onlinedegree.iitm.ac.in/t/{topic_id}",
+    },
+}
 
 # --- Load Models and Data ---
-print("📦 Loading models and data...")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini = genai.GenerativeModel("gemini-2.0-flash-lite")
+# Only cheap state is built at import. Gemini, the index and the encoder load in
+# background startup phases, so the port opens (and /healthz answers) at once.
+gemini = None
+model = None
+answer_cache = None
+semantic_cache = None
+
+query_cache = EmbeddingCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+query_log_lock = threading.Lock()
+
+def encode_batch(texts):
+    return model.encode(texts, batch_size=ENCODE_MAX_BATCH_SIZE)
+
+# model.encode is CPU-bound; it runs on its own small pool so it never blocks the event loop
+encode_executor = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+# Single questions from concurrent requests are encoded together, one batch per encode thread
+encode_batcher = MicroBatcher(encode_batch, encode_executor,
+                              max_batch_size=ENCODE_MAX_BATCH_SIZE, max_wait_ms=ENCODE_MAX_WAIT_MS,
+                              max_concurrent=ENCODE_WORKERS)
+request_limiter = ConcurrencyLimiter(MAX_INFLIGHT_REQUESTS)
+gemini_semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+stage_stats = StageStats()
+# Captions keyed by a hash of the decoded image, shared with generate_captions.py
+image_captions = CaptionCache()
+
+def on_index_swap(generation):
+    # Answers cached against the previous artifacts no longer match the index.
+    # Runs on the event loop: the version switch is in memory, the SQLite
+    # purge of the old rows goes to a thread
+    if answer_cache is not None and answer_cache.set_version(generation.version):
+        threading.Thread(target=answer_cache.purge, name="answer-cache-purge", daemon=True).start()
+    if semantic_cache is not None:
+        semantic_cache.clear()
+
+# Serving artifacts are memory-mapped, not unpickled; build them with build_search_index.py.
+# A rebuild is picked up as a new generation without restarting the worker.
+index_manager = IndexManager(ARTIFACT_DIR, nprobe=INDEX_NPROBE, on_swap=on_index_swap)
+
+# --- Startup phases ---
+def load_search_index():
+    global answer_cache
+    index_manager.swap(*index_manager.load())
+    # Answers are tagged with the index build time, so rebuilt artifacts invalidate them
+    answer_cache = AnswerCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, db_path=ANSWER_CACHE_DB or None,
+                               version=index_manager.current.version)
+
+def load_gemini():
+    global gemini
+    import google.generativeai as genai  # slow import, kept off the import path
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    gemini = genai.GenerativeModel("gemini-2.0-flash-lite")
 
-forum = np.load(FORUM_EMBED_FILE, allow_pickle=True)
-forum_embeddings = forum['embeddings']
-forum_metadata = forum['metadata']
+def load_model():
+    global model, semantic_cache
+    model = load_encoder()  # ENCODER_BACKEND picks PyTorch or ONNX Runtime
+    semantic_cache = SemanticCache(dim=model.get_sentence_embedding_dimension(), maxsize=SEMANTIC_CACHE_SIZE,
+                                   threshold=SEMANTIC_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL)
 
-course = np.load(COURSE_EMBED_FILE, allow_pickle=True)
-course_embeddings = course['embeddings']
-course_texts = course['texts']
-with open(COURSE_CHUNKS_META, 'r', encoding='utf-8') as f:
-    course_metadata = json.load(f)
+def warm_up_model():
+    model.encode(["warm up"])  # the first call pays for lazy kernel and allocator setup
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+def load_query_cache():
+    if QUERY_CACHE_FILE:
+        print(f"🗃️ Loaded {query_cache.load(QUERY_CACHE_FILE)} cached query embeddings")
+
+startup = Startup([
+    ("index", load_search_index),
+    ("gemini", load_gemini),
+    ("encoder", load_model),
+    ("warm_up", warm_up_model),
+    ("query_cache", load_query_cache),
+])
+
+@asynccontextmanager
+async def lifespan(app):
+    print("📦 Loading models and data in the background...")
+    startup.start()
+    watcher = asyncio.create_task(index_manager.watch(INDEX_RELOAD_INTERVAL)) if INDEX_RELOAD_INTERVAL > 0 else None
+    yield
+    if watcher:
+        watcher.cancel()
+    if QUERY_CACHE_FILE and startup.ready.is_set():
+        query_cache.save(QUERY_CACHE_FILE)
+    encode_executor.shutdown(wait=False)
 
 # --- FastAPI App ---
-app = FastAPI(title="Virtual Teaching Assistant API")
+app = FastAPI(title="Virtual Teaching Assistant API", lifespan=lifespan)
 from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -54,88 +164,414 @@ class AskRequest(BaseModel):
     question: str
     image: Optional[str] = None  # base64-encoded image
 
+class AskBatchRequest(BaseModel):
+    questions: List[AskRequest]
+
+@dataclass
+class AskInput:
+    # A question after ingestion: the image, if any, as size-checked raw bytes
+    question: str
+    image: Optional[bytes] = None
+
 # --- Helpers ---
-def decode_image(image_b64: str) -> Image.Image:
+def ingest(question: str, image_b64: Optional[str] = None) -> AskInput:
     try:
-        image_data = base64.b64decode(image_b64)
-        return Image.open(BytesIO(image_data)).convert("RGB")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"❌ Failed to decode image: {str(e)}")
+        return AskInput(question, decode_base64(image_b64) if image_b64 else None)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"❌ Failed to decode image: {str(e)}")
+
+def check_image(image_data: bytes):
+    # Header and pixel-count check only; the full decode happens off the event loop
+    try:
+        open_image(image_data)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"❌ Failed to decode image: {str(e)}")
 
-def search_top_k(query_embedding, db_embeddings, k=TOP_K):
-    sims = cosine_similarity([query_embedding], db_embeddings)[0]
-    return np.argsort(sims)[::-1][:k]
+def decode_image(image_data: bytes):
+    # Bounded decode, downscaled to TARGET_IMAGE_SIZE before it is sent to Gemini,
+    # plus its caption-cache key. CPU-bound: runs on a worker thread.
+    try:
+        return prepare_image(image_data)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"❌ Failed to decode image: {str(e)}")
+
+async def embed_question(question: str):
+    # Near-identical questions share one embedding; hits skip the transformer
+    key = normalize_question(question)
+    embedding = query_cache.get(key)
+    if embedding is None:
+        embedding = await encode_batcher.submit(key)
+        query_cache.put(key, embedding)
+    return embedding
+
+async def embed_questions(questions: List[str]):
+    # One model.encode call for every question the cache doesn't already hold
+    keys = [normalize_question(q) for q in questions]
+    embeddings = {key: query_cache.get(key) for key in keys}
+    missing = [key for key, embedding in embeddings.items() if embedding is None]
+    if missing:
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(
+            encode_executor, partial(model.encode, missing, batch_size=ENCODE_BATCH_SIZE))
+        for key, embedding in zip(missing, encoded):
+            query_cache.put(key, embedding)
+            embeddings[key] = embedding
+    return np.stack([embeddings[key] for key in keys])
+
+async def generate(contents):
+    async with gemini_semaphore:
+        response = await gemini.generate_content_async(contents)
+    return response.text.strip()
+
+async def generate_stream(contents):
+    async with gemini_semaphore:
+        response = await gemini.generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def log_query(question: str):
+    if not QUERY_LOG_FILE:
+        return
+    line = json.dumps({"ts": time.time(), "question": question}, ensure_ascii=False)
+    with query_log_lock, open(QUERY_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(line + "\n")
+
+def search_top_k(generation, query_embedding, k=TOP_K):
+    # One scan over the merged index; returns {corpus name: local indices}
+    if SEARCH_MODE == "interleaved":
+        weights = {name: spec["weight"] for name, spec in CORPORA.items()}
+        return generation.index.search_interleaved(query_embedding, k=k * len(CORPORA), weights=weights)
+    return generation.index.search_by_source(query_embedding, k=k)
 
-def get_forum_links(indices):
+def search_top_k_batch(generation, query_embeddings, k=TOP_K):
+    # Per-source mode scores the whole batch with one matrix-matrix product
+    if SEARCH_MODE == "interleaved":
+        return [search_top_k(generation, query_embedding, k=k) for query_embedding in query_embeddings]
+    return generation.index.search_by_source_batch(query_embeddings, k=k)
+
+def get_links(records, source, indices):
+    url_template = CORPORA[source].get("url")
+    if not url_template:
+        return []
     links = []
     for idx in indices:
-        post = forum_metadata[idx]
-        url = f"https://discourse.onlinedegree.iitm.ac.in/t/{post['topic_id']}"
+        record = records[source][idx]
         links.append({
-            "url": url,
-            "text": post.get("title", "Forum Post")
+            "url": url_template.format(**record),
+            "text": record.get("title", "Forum Post")
         })
     return links
 
-def describe_image(image: Image.Image) -> str:
+def get_all_links(records, hits):
+    links = []
+    for source in CORPORA:
+        if source in records:
+            links.extend(get_links(records, source, hits.get(source, [])))
+    return links
+
+async def describe_image(image: Image.Image) -> str:
     try:
-        response = gemini.generate_content([
+        return await generate([
             image,
             "Describe this image for an academic Q&A forum assistant."
         ])
-        return response.text.strip()
     except Exception as e:
         return f"(❌ Failed to describe image: {str(e)})"
 
-def build_context(question: str, image_caption: Optional[str] = None):
-    query_embedding = model.encode(question)
+def build_context(question: str, hits, records, image_caption: Optional[str] = None):
+    full_context = "You are a virtual assistant for a data science course. Use the forum discussions, course materials, and image (if any) to answer the question.\n"
+    for source, spec in CORPORA.items():
+        if source not in records:
+            continue
+        indices = hits.get(source, [])
+        source_context = "\n\n".join([records[source][i]['text'] for i in indices])
+        full_context += f"\n---\n\n### {spec['heading']}:\n{source_context}\n"
 
-    forum_idx = search_top_k(query_embedding, forum_embeddings)
-    forum_context = "\n\n".join([forum_metadata[i]['text'] for i in forum_idx])
-    forum_links = get_forum_links(forum_idx)
+    if image_caption:
+        full_context += f"\n\n### Image Context:\n{image_caption}"
 
-    course_idx = search_top_k(query_embedding, course_embeddings)
-    course_context = "\n\n".join([course_texts[i] for i in course_idx])
+    full_context += f"\n\nNow answer the question:\n{question}"
 
-    full_context = f"""You are a virtual assistant for a data science course. Use the forum discussions, course materials, and image (if any) to answer the question.
+    return full_context
 
----
+# --- Request pipeline ---
+@dataclass
+class Retrieval:
+    generation: object  # the index generation this request searched
+    embedding: object
+    hits: dict
+    links: list
+    cache_key: str
+    use_semantic_cache: bool
+    cached: Optional[dict] = None
 
-### Course Material:
-{course_context}
+async def retrieve(ask: AskInput, timer: StageTimer) -> Retrieval:
+    log_query(ask.question)
+    generation = index_manager.current
+    with timer.stage("embed"):
+        query_embedding = await embed_question(ask.question)
+    with timer.stage("search"):
+        hits = search_top_k(generation, query_embedding)
+    return await lookup_answer(ask, generation, query_embedding, hits, timer)
 
----
+async def lookup_answer(ask: AskInput, generation, query_embedding, hits, timer: StageTimer) -> Retrieval:
+    image_hash = hashlib.sha256(ask.image).hexdigest() if ask.image else None
+    use_semantic_cache = SEMANTIC_CACHE_THRESHOLD > 0 and not ask.image
 
-### Forum Discussions:
-{forum_context}
-"""
+    # Retrieval is cheap; look the answer up before building the prompt. The
+    # SQLite tiers of the caches are read and written on worker threads.
+    with timer.stage("cache"):
+        cache_key = AnswerCache.make_key(ask.question, hits, image_hash)
+        cached = await asyncio.to_thread(answer_cache.get, cache_key)
+        if cached is None and use_semantic_cache:
+            cached, _ = semantic_cache.lookup(query_embedding)  # paraphrases of a cached question
+    return Retrieval(generation, query_embedding, hits, get_all_links(generation.records, hits),
+                     cache_key, use_semantic_cache, cached)
 
-    if image_caption:
-        full_context += f"\n\n### Image Context:\n{image_caption}"
+async def caption_image(image_data: bytes, timer: StageTimer) -> str:
+    with timer.stage("decode_image"):
+        image, key = await asyncio.to_thread(decode_image, image_data)
+    with timer.stage("caption"):
+        caption = await asyncio.to_thread(image_captions.get, key)
+        if caption is None:
+            caption = await describe_image(image)
+            if not caption.startswith("(❌"):
+                await asyncio.to_thread(image_captions.put, key, caption)
+        return caption
 
-    full_context += f"\n\nNow answer the question:\n{question}"
+def start_caption(ask: AskInput, timer: StageTimer):
+    # The caption doesn't depend on retrieval, so it runs alongside it. Only the
+    # header is checked up front, so an unreadable image still fails the request
+    # immediately; decoding and hashing happen inside the caption task.
+    if not ask.image:
+        return None
+    check_image(ask.image)
+    task = asyncio.create_task(caption_image(ask.image, timer))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # skipped tasks don't log stray errors
+    return task
 
-    return full_context, forum_links
+async def start_pipeline(ask: AskInput, timer: StageTimer):
+    # Pipeline DAG: (caption || embed -> search -> cache lookup) -> prompt.
+    # Returns the retrieval and the still-running caption task, if any.
+    caption_task = start_caption(ask, timer)
+    try:
+        retrieval = await retrieve(ask, timer)
+    except BaseException:
+        if caption_task:
+            caption_task.cancel()
+        raise
+    if retrieval.cached is not None and caption_task:
+        caption_task.cancel()  # the cached answer doesn't need the caption
+        caption_task = None
+    return retrieval, caption_task
 
-# --- Endpoint ---
-@app.post("/ask")
-def ask_virtual_ta(request: AskRequest):
+async def finish_prompt(ask: AskInput, retrieval: Retrieval, caption_task, timer: StageTimer):
+    image_caption = await caption_task if caption_task else None
+    with timer.stage("prompt"):
+        context = build_context(ask.question, retrieval.hits, retrieval.generation.records, image_caption)
+    return context, image_caption
+
+async def remember_answer(retrieval: Retrieval, result: dict, image_caption: Optional[str]):
+    if retrieval.generation is not index_manager.current:
+        return  # answered from an index that has since been swapped out
+    if not (image_caption or "").startswith("(❌"):
+        # don't pin answers built on a failed caption
+        await asyncio.to_thread(answer_cache.put, retrieval.cache_key, result)
+    if retrieval.use_semantic_cache:
+        semantic_cache.put(retrieval.embedding, result)
+
+async def answer_question(ask: AskInput, timer: StageTimer):
+    retrieval, caption_task = await start_pipeline(ask, timer)
+    if retrieval.cached is not None:
+        return retrieval.cached
+    return await complete_answer(ask, retrieval, caption_task, timer)
+
+async def complete_answer(ask: AskInput, retrieval: Retrieval, caption_task, timer: StageTimer):
+    context, image_caption = await finish_prompt(ask, retrieval, caption_task, timer)
+
+    with timer.stage("generate"):
+        answer = await generate(context)
+
+    result = {
+        "answer": answer,
+        "links": retrieval.links
+    }
+    await remember_answer(retrieval, result, image_caption)
+    return result
+
+async def stream_answer(ask: AskInput):
+    # Server-Sent Events: links as soon as retrieval finishes, then answer tokens
+    timer = StageTimer()
+    try:
+        retrieval, caption_task = await start_pipeline(ask, timer)
+        yield sse_event("links", retrieval.links)
+        if retrieval.cached is not None:
+            yield sse_event("token", {"text": retrieval.cached["answer"]})
+            yield sse_event("timings", timer.as_dict())
+            yield sse_event("done", {"cached": True})
+            return
+
+        context, image_caption = await finish_prompt(ask, retrieval, caption_task, timer)
+        parts = []
+        with timer.stage("generate"):
+            async for text in generate_stream(context):
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+
+        await remember_answer(retrieval, {"answer": "".join(parts).strip(), "links": retrieval.links}, image_caption)
+        yield sse_event("timings", timer.as_dict())
+        yield sse_event("done", {"cached": False})
+    except HTTPException as e:
+        yield sse_event("error", {"status": e.status_code, "detail": e.detail})
+    except Exception as e:
+        yield sse_event("error", {"status": 500, "detail": f"❌ Error: {str(e)}"})
+    finally:
+        stage_stats.record(timer)
+
+async def answer_batch(asks: List[AskInput], timer: StageTimer):
+    # Embedding and search run once for the whole batch; only generation is
+    # per question, fanned out under a per-batch limit
+    for ask in asks:
+        log_query(ask.question)
+    generation = index_manager.current
+    with timer.stage("batch_embed"):
+        query_embeddings = await embed_questions([ask.question for ask in asks])
+    with timer.stage("batch_search"):
+        batch_hits = search_top_k_batch(generation, query_embeddings)
+
+    limit = asyncio.Semaphore(BATCH_GENERATE_CONCURRENCY)
+
+    async def answer_one(ask, query_embedding, hits):
+        item_timer = StageTimer()
+        try:
+            retrieval = await lookup_answer(ask, generation, query_embedding, hits, item_timer)
+            if retrieval.cached is not None:
+                return retrieval.cached
+            async with limit:
+                return await complete_answer(ask, retrieval, start_caption(ask, item_timer), item_timer)
+        except HTTPException as e:
+            return {"error": e.detail, "status": e.status_code}
+        except Exception as e:
+            return {"error": f"❌ Error: {str(e)}", "status": 500}
+
+    with timer.stage("batch_generate"):
+        return await asyncio.gather(*(answer_one(ask, query_embedding, hits)
+                                      for ask, query_embedding, hits in zip(asks, query_embeddings, batch_hits)))
+
+def require_ready():
+    if not startup.ready.is_set():
+        raise HTTPException(status_code=503, detail="⏳ Still starting up, retry shortly",
+                            headers={"Retry-After": "5"})
+
+def too_many_requests():
+    return HTTPException(status_code=429, detail="⏳ Too many requests in flight, retry shortly",
+                         headers={"Retry-After": "1"})
+
+async def respond(ask: AskInput, response: Response):
+    timer = StageTimer()
     try:
-        image_caption = None
+        with request_limiter.slot():
+            result = await answer_question(ask, timer)
+        stage_stats.record(timer)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return result
+    except Saturated:
+        raise too_many_requests()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"❌ Error: {str(e)}")
 
-        if request.image:
-            image = decode_image(request.image)
-            image_caption = describe_image(image)
+async def ingest_upload(question: str, upload: Optional[UploadFile]) -> AskInput:
+    if upload is None:
+        return AskInput(question)
+    data = await upload.read(MAX_IMAGE_BYTES + 1)  # one byte over the limit is enough to reject
+    try:
+        check_size(data)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=f"❌ Failed to read image: {str(e)}")
+    return AskInput(question, data)
 
-        context, links = build_context(request.question, image_caption)
+# --- Endpoint ---
+@app.post("/ask")
+async def ask_virtual_ta(request: AskRequest, response: Response):
+    require_ready()
+    return await respond(ingest(request.question, request.image), response)
 
-        response = gemini.generate_content(context)
-        answer = response.text.strip()
+@app.post("/ask/upload")
+async def ask_virtual_ta_upload(response: Response, question: str = Form(...),
+                                image: Optional[UploadFile] = File(None)):
+    # Multipart alternative to /ask: raw image bytes, no base64 inflation or double buffering
+    require_ready()
+    return await respond(await ingest_upload(question, image), response)
 
-        return {
-            "answer": answer,
-            "links": links
-        }
+@app.post("/ask_batch")
+async def ask_virtual_ta_batch(request: AskBatchRequest, response: Response):
+    # Bulk questions (evaluation runs, LMS sync) in one request: results come
+    # back in order, one entry per question, failures as {"error", "status"}
+    require_ready()
+    if len(request.questions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"❌ Batch exceeds {MAX_BATCH_SIZE} questions")
+    if not request.questions:
+        return {"results": []}
+    asks = []
+    for item in request.questions:
+        try:
+            asks.append(ingest(item.question, item.image))
+        except HTTPException as e:
+            asks.append(e)
+    valid = [ask for ask in asks if isinstance(ask, AskInput)]
 
+    timer = StageTimer()
+    try:
+        with request_limiter.slot():
+            answers = iter(await answer_batch(valid, timer) if valid else [])
+    except Saturated:
+        raise too_many_requests()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"❌ Error: {str(e)}")
+    stage_stats.record(timer)
+    response.headers["Server-Timing"] = timer.server_timing()
+    return {"results": [next(answers) if isinstance(ask, AskInput) else {"error": ask.detail, "status": ask.status_code}
+                        for ask in asks]}
+
+@app.post("/ask/stream")
+async def ask_virtual_ta_stream(request: AskRequest):
+    require_ready()
+    ask = ingest(request.question, request.image)
+    # The response releases the slot once the stream ends or the client goes away
+    if not request_limiter.try_acquire():
+        raise too_many_requests()
+    return AdmittedStreamingResponse(stream_answer(ask), request_limiter, media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "startup": startup.status(),
+        "index": index_manager.stats(),
+        "query_cache": query_cache.stats(),
+        "encode_batches": encode_batcher.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "requests": request_limiter.stats(),
+        "stages": stage_stats.stats(),
+        "caption_cache": image_captions.stats(),
+    }
+
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving, whether or not startup has finished
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(response: Response):
+    # Readiness: the index is mapped and the encoder and Gemini client are loaded
+    status = startup.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
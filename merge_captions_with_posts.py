@@ -1,5 +1,6 @@
 import os
 import json
+from caption_cache import load_path_captions
 
 # --- Config ---
 POSTS_FILE = './tds_forum_data/tds_all_posts_with_local_images.json'
@@ -10,13 +11,13 @@ OUTPUT_FILE = './tds_forum_data/tds_all_posts_with_image_captions.json'
 with open(POSTS_FILE, 'r', encoding='utf-8') as f:
     posts = json.load(f)
 
-with open(CAPTION_CACHE_FILE, 'r', encoding='utf-8') as f:
-    caption_cache = json.load(f)
+caption_cache = load_path_captions(CAPTION_CACHE_FILE)  # snapshot plus any captions still in the log
 
 # --- Attach captions to each post ---
 for post in posts:
     local_paths = post.get("local_image_paths", [])
-    captions = [caption_cache.get(path, "") for path in local_paths]
+    # "" keeps the slot of an image that failed to download or caption
+    captions = [caption_cache.get(path, "") if path else "" for path in local_paths]
     post["image_captions"] = captions
 
 # --- Save updated posts ---
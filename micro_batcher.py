@@ -0,0 +1,104 @@
+import time
+import asyncio
+from collections import deque
+import numpy as np
+
+# --- Micro-batching ---
+class _Pending:
+    __slots__ = ("item", "future", "enqueued")
+
+    def __init__(self, item, future):
+        self.item = item
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    # Collects items submitted by concurrent requests and hands them to
+    # batch_fn together. A batch starts once max_batch_size items are waiting,
+    # or the oldest has waited max_wait_ms, and a worker is free; while all
+    # workers are busy, arrivals keep accumulating into the next batch.
+    def __init__(self, batch_fn, executor, max_batch_size=32, max_wait_ms=5.0, max_concurrent=1,
+                 history=2048):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent = max_concurrent
+        self.pending = deque()
+        self.running = 0
+        self._timer = None
+        self._loop = None
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}  # power-of-two bucket -> batch count
+        self.queue_delays = deque(maxlen=history)  # seconds, most recent items
+
+    async def submit(self, item):
+        self._loop = asyncio.get_running_loop()
+        entry = _Pending(item, self._loop.create_future())
+        self.pending.append(entry)
+        self._schedule()
+        return await entry.future
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.pending and self.running < self.max_concurrent:
+            delay = self.pending[0].enqueued + self.max_wait - time.perf_counter()
+            if len(self.pending) < self.max_batch_size and delay > 0:
+                self._timer = self._loop.call_later(delay, self._schedule)
+                return
+            self._start_batch()
+
+    def _start_batch(self):
+        batch = []
+        while self.pending and len(batch) < self.max_batch_size:
+            entry = self.pending.popleft()
+            if not entry.future.cancelled():  # the request went away while queued
+                batch.append(entry)
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.queue_delays.extend(started - entry.enqueued for entry in batch)
+        self.batches += 1
+        self.items += len(batch)
+        bucket = 1 << (len(batch).bit_length() - 1)
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        self.running += 1
+        self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            results = await self._loop.run_in_executor(self.executor, self.batch_fn, [e.item for e in batch])
+            for entry, result in zip(batch, results):
+                if not entry.future.done():
+                    entry.future.set_result(result)
+        except Exception as e:
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+        finally:
+            self.running -= 1
+            self._schedule()
+
+    def stats(self):
+        delays_ms = np.array(self.queue_delays) * 1000
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": {f"{size}-{2 * size - 1}" if size > 1 else "1": count
+                            for size, count in sorted(self.batch_sizes.items())},
+            "queue_delay_ms": {
+                "mean": round(float(delays_ms.mean()), 2) if len(delays_ms) else 0.0,
+                "p50": round(float(np.percentile(delays_ms, 50)), 2) if len(delays_ms) else 0.0,
+                "p95": round(float(np.percentile(delays_ms, 95)), 2) if len(delays_ms) else 0.0,
+                "max": round(float(delays_ms.max()), 2) if len(delays_ms) else 0.0,
+            },
+            "pending": len(self.pending),
+            "running": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,135 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import numpy as np
+from artifacts import ARTIFACT_DIR
+from encoder import ENCODER_BACKEND, ENCODER_MODEL, load_encoder
+
+# --- Config ---
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", str(os.cpu_count() or 1)))  # encoder processes for full rebuilds and large backlogs
+SHARD_SIZE = int(os.getenv("BUILD_SHARD_SIZE", "2048"))  # texts per shard
+ENCODE_BATCH_SIZE = 64
+SHARD_DIR = os.path.join(ARTIFACT_DIR, 'embedding_shards')
+QUEUED_SHARDS = 4  # shards prepared ahead of the encoder
+
+# --- Sharded encoder ---
+class ShardedEncoder:
+    # Texts are add()ed as preprocessing produces them; full shards go to a
+    # background thread that encodes them and writes each one to disk.
+    # finish() merges the shards, in add() order, into one array. With the
+    # torch backend, full rebuilds and runs that pile up a backlog of shards
+    # move to a SentenceTransformer multi-process pool; small incremental runs
+    # stay on one in-process model.
+    def __init__(self, name, model_name=ENCODER_MODEL, workers=BUILD_WORKERS, shard_size=SHARD_SIZE,
+                 batch_size=ENCODE_BATCH_SIZE, shard_dir=SHARD_DIR, full=False):
+        self.model_name = model_name
+        self.full = full
+        self.workers = workers
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.shard_dir = os.path.join(shard_dir, name)
+        self.buffer = []
+        self.count = 0
+        self.paths = []
+        self.error = None
+        self.shards = None
+        self.thread = None
+        self.model = None
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread is not None and self.thread.is_alive():
+            self.shards.put(None)
+            self.thread.join()
+        self._stop_pool()
+
+    def add(self, text):
+        if self.thread is None:
+            self._start()
+        self.buffer.append(text)
+        self.count += 1
+        if len(self.buffer) >= self.shard_size:
+            self._submit()
+
+    def finish(self):
+        if self.thread is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if self.buffer:
+            self._submit()
+        self.shards.put(None)
+        self.thread.join()
+        self._stop_pool()
+        if self.error is not None:
+            raise self.error
+        embeddings = np.concatenate([np.load(path) for path in self.paths])
+        for path in set(self.paths):
+            os.remove(path)
+        return embeddings
+
+    def _submit(self):
+        self.paths.append(None)  # keeps add() order whatever the shard's file name
+        self.shards.put((len(self.paths) - 1, self.buffer))
+        self.buffer = []
+
+    def _start(self):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.shards = queue.Queue(maxsize=QUEUED_SHARDS)
+        self.thread = threading.Thread(target=self._encode_shards, name="encode-shards", daemon=True)
+        self.thread.start()
+
+    def _wants_pool(self, backlog):
+        # The pool loads the model once per process: worth it for a full rebuild
+        # or when shards are queued behind this one, not for a handful of texts.
+        # ONNX Runtime already spreads one session across every core.
+        return (ENCODER_BACKEND == "torch" and self.workers > 1 and self.pool is None
+                and (self.full or backlog > 0))
+
+    def _load_model(self, backlog):
+        if self.model is None:
+            self.model = load_encoder(model_name=self.model_name)
+        if self._wants_pool(backlog):
+            # Split the cores between the pool's processes instead of oversubscribing them
+            os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // self.workers)))
+            self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+            print(f"⚙️ Encoding on {self.workers} processes")
+
+    def _stop_pool(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+    def _encode(self, texts):
+        if self.pool is not None:
+            return self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+    def _encode_shards(self):
+        while True:
+            item = self.shards.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # drain so add() never blocks after a failure
+            number, texts = item
+            # Model and backend are part of the name: ONNX vectors differ slightly from PyTorch's
+            digest = hashlib.sha256(f"{self.model_name}\0{ENCODER_BACKEND}\0".encode('utf-8'))
+            for text in texts:
+                digest.update(text.encode('utf-8') + b"\0")
+            path = os.path.join(self.shard_dir, f"{digest.hexdigest()[:24]}.npy")
+            try:
+                # A shard left by an interrupted run with the same texts is reused
+                if not os.path.exists(path):
+                    self._load_model(backlog=len(self.paths) - number - 1)  # shards submitted after this one
+                    started = time.perf_counter()
+                    embeddings = self._encode(texts)
+                    np.save(path + ".tmp.npy", np.asarray(embeddings, dtype=np.float32))
+                    os.replace(path + ".tmp.npy", path)
+                    print(f"🧩 Shard {number}: {len(texts)} texts in {time.perf_counter() - started:.1f}s")
+                self.paths[number] = path
+            except Exception as e:
+                self.error = e
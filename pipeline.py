@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from discourse_client import Checkpoint, DiscourseClient, pooled_session
+from scrape_data import (BASE_URL, CHECKPOINT_EVERY, CHECKPOINT_FILE, CONCURRENCY, END_DATE, HEADERS,
+                         RATE_LIMIT, SAVE_DIR, START_DATE, TOPIC_DIR, fetch_topic, get_all_topics,
+                         is_current, iso_date, iter_posts, save_json)
+from process_images import DOWNLOAD_WORKERS, IMAGE_DIR, URL_INDEX, download_image, load_url_index
+from posts_with_captions import embed_captions
+from create_embeddings import embed_posts
+
+# --- Config ---
+# One pass: scrape -> images -> captions -> HTML merge -> text -> embed. Posts
+# stream through generator stages, so only a bounded window is ever in memory
+# and the slow stages (HTTP, Gemini, encoder) overlap instead of running back to back.
+POSTS_JSONL = os.path.join(SAVE_DIR, "tds_posts.jsonl")  # one enriched post per line
+STAGE_WINDOW = int(os.getenv("PIPELINE_WINDOW", "64"))  # posts in flight per concurrent stage
+
+# --- Plumbing ---
+def bounded_map(fn, items, workers, window=None):
+    # Like executor.map, but ordered and lazy: pulls at most `window` items
+    # ahead of the consumer instead of submitting the whole input up front
+    window = max(window or STAGE_WINDOW, workers)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+class StageCounter:
+    # Posts and wall time seen by each stage, printed at the end of the run
+    def __init__(self):
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    def tap(self, name, posts):
+        self.counts[name] = 0
+        return self._count(name, posts)
+
+    def _count(self, name, posts):
+        for post in posts:
+            self.counts[name] += 1
+            yield post
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        return {"elapsed_s": round(elapsed, 1), **self.counts}
+
+def write_jsonl(posts, path):
+    # Appends each post as it passes; the file replaces the previous run's
+    # only once the stream is exhausted, so an interrupted run leaves it intact
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for post in posts:
+            f.write(json.dumps(post, ensure_ascii=False) + "\n")
+            yield post
+    os.replace(tmp_path, path)
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# --- Stages ---
+def sync_topic(client, checkpoint, topic):
+    status = 304
+    if not is_current(topic, checkpoint):
+        _, status = fetch_topic(client, checkpoint, topic)
+    return topic, status
+
+def scraped_posts(client, checkpoint):
+    # Topics are fetched concurrently (only new or bumped ones hit the network)
+    # and their posts are yielded in topic order as soon as each one lands
+    start, end = iso_date(START_DATE), iso_date(END_DATE)
+    topics = get_all_topics(client)
+    print(f"🔍 Total topics fetched: {len(topics)}")
+    failed = []
+    try:
+        for topic, status in bounded_map(partial(sync_topic, client, checkpoint), topics, CONCURRENCY):
+            if status not in (200, 304):
+                failed.append(topic["id"])
+            if checkpoint.dirty >= CHECKPOINT_EVERY:
+                checkpoint.save()
+            yield from iter_posts([topic], start, end)
+    finally:
+        checkpoint.save()
+        print(f"📊 HTTP: {client.stats()}")
+    if failed:
+        print(f"⚠️ {len(failed)} topics failed and will be retried next run: {failed[:10]}")
+
+def fetched_images(posts):
+    url_index = {url: path for url, path in load_url_index().items() if os.path.exists(path)}
+    session = pooled_session(DOWNLOAD_WORKERS)
+
+    def fetch(post):
+        for url in post.get("image_urls", []):
+            if url not in url_index:
+                path = download_image(session, url)
+                if path:
+                    url_index[url] = path
+        # One slot per image URL, None where the download failed
+        post["local_image_paths"] = [url_index.get(url) for url in post.get("image_urls", [])]
+        return post
+
+    try:
+        yield from bounded_map(fetch, posts, DOWNLOAD_WORKERS)
+    finally:
+        save_json(url_index, URL_INDEX)
+
+def captioned(posts):
+    # Imported here: configures Gemini and opens the caption log
+    from generate_captions import CAPTION_WORKERS, caption_cache, gemini_bucket, generate_caption_with_gemini
+
+    def caption(post):
+        captions = (generate_caption_with_gemini(path) if path else "" for path in post.get("local_image_paths", []))
+        # "" keeps a failed image's slot: embed_captions matches captions to <img> tags through image_urls
+        post["image_captions"] = [c or "" for c in captions]
+        return post
+
+    try:
+        yield from bounded_map(caption, posts, CAPTION_WORKERS)
+    finally:
+        caption_cache.close()  # compact the log into caption_cache.json
+        print(f"📊 Gemini limiter: {gemini_bucket.stats()}")
+
+# --- Main ---
+def run():
+    os.makedirs(TOPIC_DIR, exist_ok=True)
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+
+    client = DiscourseClient(BASE_URL, headers=HEADERS, concurrency=CONCURRENCY, rate=RATE_LIMIT)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+    counter = StageCounter()
+
+    if "--offline" in sys.argv:
+        # Re-embed the last run's enriched posts without touching the network
+        posts = counter.tap("posts", read_jsonl(POSTS_JSONL))
+    else:
+        posts = counter.tap("scraped", scraped_posts(client, checkpoint))
+        posts = counter.tap("images", fetched_images(posts))
+        posts = counter.tap("captioned", captioned(posts))
+        posts = counter.tap("merged", map(embed_captions, posts))
+        posts = write_jsonl(posts, POSTS_JSONL)
+
+    embed_posts(posts)
+    print(f"✅ Pipeline done: {counter.report()}")
+
+if __name__ == "__main__":
+    run()
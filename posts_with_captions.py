@@ -1,35 +1,51 @@
 import os
 import json
-from bs4 import BeautifulSoup
+from lxml import etree
+from html_text import fragment, serialize
 
 # --- Config ---
 INPUT_FILE = './tds_forum_data/tds_all_posts_with_image_captions.json'
 OUTPUT_FILE = './tds_forum_data/tds_all_posts_final.json'
 
-# --- Load posts ---
-with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-    posts = json.load(f)
-
-# --- Process posts ---
-for post in posts:
+# --- Helpers ---
+def embed_captions(post):
     html = post.get("cooked_html", "")
     captions = post.get("image_captions", [])
-    
-    if not captions or not html:
-        continue  # skip if no images or no HTML
-
-    soup = BeautifulSoup(html, "html.parser")
-    img_tags = soup.find_all("img")
-
-    for img_tag, caption in zip(img_tags, captions):
-        caption_tag = soup.new_tag("em")
-        caption_tag.string = caption
-        img_tag.replace_with(caption_tag)
 
-    post["cooked_html_with_captions"] = str(soup)
-
-# --- Save result ---
-with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-    json.dump(posts, f, ensure_ascii=False, indent=2)
-
-print(f"✅ Captions embedded in HTML and saved to: {OUTPUT_FILE}")
+    if not captions or not html:
+        return post  # skip if no images or no HTML
+
+    root = fragment(html)
+    if root is None:
+        return post
+
+    # Captions line up with image_urls ("" where an image failed), and each
+    # <img> is matched by its src, so a missing caption never shifts the others
+    by_src = dict(zip(post.get("image_urls", []), captions))
+    for img_tag in list(root.iter("img")):
+        caption = by_src.get(img_tag.get("src"))
+        if not caption:
+            continue
+        caption_tag = etree.Element("em")
+        caption_tag.text = caption
+        caption_tag.tail = img_tag.tail
+        img_tag.getparent().replace(img_tag, caption_tag)
+
+    post["cooked_html_with_captions"] = serialize(root)
+    return post
+
+# --- Main ---
+def run():
+    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+        posts = json.load(f)
+
+    for post in posts:
+        embed_captions(post)
+
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(posts, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Captions embedded in HTML and saved to: {OUTPUT_FILE}")
+
+if __name__ == "__main__":
+    run()
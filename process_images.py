@@ -1,48 +1,89 @@
 import os
 import json
-import requests
+import hashlib
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from discourse_client import pooled_session
+from scrape_data import BASE_URL, save_json
 
 # --- Config ---
 INPUT_JSON = './tds_forum_data/tds_all_posts.json'
 OUTPUT_JSON = './tds_forum_data/tds_all_posts_with_local_images.json'
 IMAGE_DIR = './tds_forum_data/images'
+URL_INDEX = os.path.join(IMAGE_DIR, 'url_index.json')  # image URL -> content-addressed local file
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "16"))
+CHUNK_SIZE = 64 * 1024
 
-# Create image directory
-os.makedirs(IMAGE_DIR, exist_ok=True)
+# --- Helpers ---
+def absolute_url(url):
+    # Discourse emits protocol-relative and site-relative upload URLs
+    return urljoin(BASE_URL + "/", url)
 
-# Load posts
-with open(INPUT_JSON, 'r', encoding='utf-8') as f:
-    posts = json.load(f)
+def load_url_index():
+    if not os.path.exists(URL_INDEX):
+        return {}
+    with open(URL_INDEX, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-# Function to download image and return local path
-def download_image(url, post_idx, img_idx):
+# --- Downloader ---
+def download_image(session, url):
+    # Streams to a temporary file while hashing, then names the file by its
+    # content: the same image behind different URLs is stored (and captioned) once
     ext = os.path.splitext(url.split("?")[0])[1] or ".jpg"
-    filename = f'post{post_idx}_img{img_idx}{ext}'
-    filepath = os.path.join(IMAGE_DIR, filename)
+    tmp_path = os.path.join(IMAGE_DIR, f".{threading.get_ident()}.part")
+    digest = hashlib.sha256()
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            return filepath
-        else:
-            print(f"❌ Failed: {url} — Status code {response.status_code}")
+        with session.get(absolute_url(url), timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                print(f"❌ Failed: {url} — Status code {response.status_code}")
+                return None
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
     except Exception as e:
         print(f"⚠️ Error downloading {url}: {e}")
-    return None
-
-# Process each post
-for i, post in tqdm(enumerate(posts), total=len(posts), desc="📥 Downloading images"):
-    local_paths = []
-    for j, url in enumerate(post.get('image_urls', [])):
-        local_path = download_image(url, i, j)
-        if local_path:
-            local_paths.append(local_path)
-    post['local_image_paths'] = local_paths
-
-# Save updated posts
-with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
-    json.dump(posts, f, ensure_ascii=False, indent=2)
-
-print("✅ All images downloaded and paths saved.")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    filepath = os.path.join(IMAGE_DIR, f"{digest.hexdigest()[:32]}{ext.lower()}")
+    if os.path.exists(filepath):
+        os.remove(tmp_path)  # duplicate content under another URL
+    else:
+        os.replace(tmp_path, filepath)
+    return filepath
+
+# --- Main ---
+def run():
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    with open(INPUT_JSON, 'r', encoding='utf-8') as f:
+        posts = json.load(f)
+
+    # Skip-if-present: URLs already downloaded to a file that still exists
+    url_index = {url: path for url, path in load_url_index().items() if os.path.exists(path)}
+    urls = {url for post in posts for url in post.get('image_urls', [])}
+    pending = sorted(urls - set(url_index))
+    print(f"📥 {len(urls)} unique image URLs, {len(urls) - len(pending)} already downloaded")
+
+    session = pooled_session(DOWNLOAD_WORKERS)
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            results = pool.map(lambda url: (url, download_image(session, url)), pending)
+            for url, path in tqdm(results, total=len(pending), desc="📥 Downloading images"):
+                if path:
+                    url_index[url] = path
+    finally:
+        save_json(url_index, URL_INDEX)
+
+    for post in posts:
+        # One slot per image URL, None where the download failed
+        post['local_image_paths'] = [url_index.get(url) for url in post.get('image_urls', [])]
+
+    save_json(posts, OUTPUT_JSON)
+    print(f"✅ All images downloaded ({len(set(url_index.values()))} unique files) and paths saved.")
+
+if __name__ == "__main__":
+    run()
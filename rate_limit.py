@@ -0,0 +1,71 @@
+import time
+import threading
+
+# --- Token bucket ---
+class TokenBucket:
+    # Thread-safe rate limiter shared by every worker of a client: acquire()
+    # blocks until a token is available. Capacity bounds the burst after idling.
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.acquired = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.acquired += 1
+                    self.waited += waited
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "acquired": self.acquired,
+            "waited_s": round(self.waited, 2),
+        }
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    # AIMD on top of the bucket: a 429 halves the rate and pauses every worker
+    # for the backoff; each success adds a little back, up to the configured rate
+    def __init__(self, rate, capacity=None, min_rate=None, decrease=0.5, increase=None):
+        super().__init__(rate, capacity)
+        self.max_rate = self.rate
+        self.min_rate = min_rate if min_rate is not None else self.rate / 16
+        self.decrease = decrease
+        self.increase = increase if increase is not None else self.rate / 20
+        self.throttled = 0
+        self.paused_until = 0.0
+
+    def penalize(self, backoff):
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now < self.paused_until:
+                return  # other workers' 429s from the same burst: already slowed down
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0) - backoff * self.rate  # shared pause
+            self.paused_until = now + backoff
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self):
+        return {**super().stats(), "max_rate": self.max_rate, "throttled": self.throttled}
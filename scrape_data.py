@@ -1,18 +1,22 @@
-import requests
 from tqdm import tqdm
-from bs4 import BeautifulSoup
 from datetime import datetime
 import json
 import os
-import time
+from discourse_client import Checkpoint, DiscourseClient
+from html_text import image_sources
 
 # --- CONFIG ---
-BASE_URL = "https://discourse.onlinedegree.iitm.ac.in"
+BASE_URL = os.getenv("DISCOURSE_URL", "https://discourse.onlinedegree.iitm.ac.in")
 CATEGORY_ID = 34  # TDS Knowledge Base
 START_DATE = "2025-01-01"
 END_DATE = "2025-04-15"
 SAVE_DIR = "tds_forum_data"
-COOKIE_STRING = "_t="  # ⚠️ Required
+COOKIE_STRING = os.getenv("DISCOURSE_COOKIE", "_t=")  # ⚠️ Required
+CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))  # topic fetches in flight
+RATE_LIMIT = float(os.getenv("SCRAPE_RATE_LIMIT", "4"))  # requests per second, shared by all workers
+TOPIC_DIR = os.path.join(SAVE_DIR, "topics")  # raw /t/{id}.json responses
+CHECKPOINT_FILE = os.path.join(SAVE_DIR, "scrape_checkpoint.json")
+CHECKPOINT_EVERY = 25  # topics between checkpoint writes
 
 # --- HEADERS ---
 HEADERS = {
@@ -28,65 +32,102 @@ def within_range(iso, start, end):
     return start <= d <= end
 
 def save_json(data, path):
-    with open(path, "w", encoding="utf-8") as f:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def topic_path(topic_id):
+    return os.path.join(TOPIC_DIR, f"{topic_id}.json")
 
 # --- Fetch paginated topics in category ---
-def get_all_topics():
+def get_all_topics(client):
     topics = []
     page = 0
     while True:
-        url = f"{BASE_URL}/latest.json?category={CATEGORY_ID}&page={page}"
-        res = requests.get(url, headers=HEADERS)
-        if res.status_code != 200:
-            print(f"Failed to fetch page {page}: {res.status_code}")
+        status, data, _ = client.get_json(f"/latest.json?category={CATEGORY_ID}&page={page}")
+        if status != 200:
+            print(f"Failed to fetch page {page}: {status}")
             break
-        items = res.json().get("topic_list", {}).get("topics", [])
+        items = data.get("topic_list", {}).get("topics", [])
         if not items:
             break
         topics.extend(items)
         print(f"✔️ Page {page}: {len(items)} topics")
         page += 1
-        time.sleep(1)  # polite delay
     return topics
 
-# --- Fetch all posts from a topic ---
-def fetch_posts(topic_id):
-    url = f"{BASE_URL}/t/{topic_id}.json"
-    res = requests.get(url, headers=HEADERS)
-    return res.json() if res.status_code == 200 else None
+# --- Fetch topics that changed since the last run ---
+def is_current(topic, checkpoint):
+    state = checkpoint.get(topic["id"])
+    return (os.path.exists(topic_path(topic["id"]))
+            and state.get("bumped_at") == topic.get("bumped_at")
+            and state.get("posts_count") == topic.get("posts_count"))
 
-# --- Main ---
-def scrape_all():
-    os.makedirs(SAVE_DIR, exist_ok=True)
-    start, end = iso_date(START_DATE), iso_date(END_DATE)
+def fetch_topic(client, checkpoint, topic):
+    topic_id = topic["id"]
+    etag = checkpoint.get(topic_id).get("etag") if os.path.exists(topic_path(topic_id)) else None
+    status, data, etag = client.get_json(f"/t/{topic_id}.json", etag=etag)
+    if status == 200:
+        save_json(data, topic_path(topic_id))
+    elif status != 304:
+        return topic_id, status
+    checkpoint.update(topic_id, bumped_at=topic.get("bumped_at"), posts_count=topic.get("posts_count"), etag=etag)
+    return topic_id, status
 
-    topics = get_all_topics()
-    print(f"🔍 Total topics fetched: {len(topics)}")
+def fetch_changed_topics(client, checkpoint, topics):
+    changed = [topic for topic in topics if not is_current(topic, checkpoint)]
+    print(f"🔄 {len(changed)} new or updated topics, {len(topics) - len(changed)} unchanged")
+    failed = []
+    try:
+        for topic_id, status in tqdm(client.map(lambda t: fetch_topic(client, checkpoint, t), changed),
+                                     total=len(changed), desc="Fetching topics"):
+            if status not in (200, 304):
+                failed.append(topic_id)
+            if checkpoint.dirty >= CHECKPOINT_EVERY:
+                checkpoint.save()
+    finally:
+        checkpoint.save()  # an interrupted run resumes from here
+    if failed:
+        print(f"⚠️ {len(failed)} topics failed and will be retried next run: {failed[:10]}")
 
-    all_data = []
-    for topic in tqdm(topics, desc="Scraping all posts"):
-        data = fetch_posts(topic["id"])
-        if not data:
+# --- Posts within the date range, read back from the topic cache ---
+def iter_posts(topics, start, end):
+    for topic in topics:
+        if not os.path.exists(topic_path(topic["id"])):
             continue
+        with open(topic_path(topic["id"]), "r", encoding="utf-8") as f:
+            data = json.load(f)
 
         for post in data["post_stream"]["posts"]:
             created_at = post["created_at"]
             if not within_range(created_at, start, end):
                 continue
 
-            soup = BeautifulSoup(post["cooked"], "html.parser")
-            images = [img["src"] for img in soup.find_all("img") if img.get("src")]
-
-            all_data.append({
+            yield {
                 "topic_id": topic["id"],
                 "title": data.get("title"),
                 "username": post["username"],
                 "created_at": created_at,
                 "raw": post.get("raw", ""),
                 "cooked_html": post["cooked"],
-                "image_urls": images
-            })
+                "image_urls": image_sources(post["cooked"])
+            }
+
+# --- Main ---
+def scrape_all():
+    os.makedirs(TOPIC_DIR, exist_ok=True)
+    start, end = iso_date(START_DATE), iso_date(END_DATE)
+
+    client = DiscourseClient(BASE_URL, headers=HEADERS, concurrency=CONCURRENCY, rate=RATE_LIMIT)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+
+    topics = get_all_topics(client)
+    print(f"🔍 Total topics fetched: {len(topics)}")
+    fetch_changed_topics(client, checkpoint, topics)
+    print(f"📊 HTTP: {client.stats()}")
+
+    all_data = list(iter_posts(topics, start, end))
 
     save_json(all_data, os.path.join(SAVE_DIR, "tds_all_posts.json"))
     print(f"\n✅ Saved {len(all_data)} posts to 'tds_all_posts.json'.")
@@ -0,0 +1,66 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# --- Per-request stage timings ---
+class StageTimer:
+    # Records when each stage started and ended, relative to the request start,
+    # so overlapping stages show up as overlapping intervals
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}  # name -> (start_ms, end_ms)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @contextmanager
+    def stage(self, name):
+        start = self.elapsed_ms()
+        try:
+            yield
+        finally:
+            self.stages[name] = (start, self.elapsed_ms())
+
+    def durations(self):
+        return {name: end - start for name, (start, end) in self.stages.items()}
+
+    def as_dict(self):
+        timings = {name: {"start_ms": round(start, 1), "duration_ms": round(end - start, 1)}
+                   for name, (start, end) in self.stages.items()}
+        timings["total"] = {"start_ms": 0.0, "duration_ms": round(self.elapsed_ms(), 1)}
+        return timings
+
+    def server_timing(self):
+        # Server-Timing header; desc carries the start offset to show the overlap
+        entries = [f'{name};dur={end - start:.1f};desc="start {start:.1f}ms"'
+                   for name, (start, end) in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+# --- Aggregated stage timings ---
+class StageStats:
+    def __init__(self):
+        self.count = {}
+        self.total_ms = {}
+        self.max_ms = {}
+        self._lock = threading.Lock()
+
+    def record(self, timer):
+        durations = timer.durations()
+        durations["total"] = timer.elapsed_ms()
+        with self._lock:
+            for name, ms in durations.items():
+                self.count[name] = self.count.get(name, 0) + 1
+                self.total_ms[name] = self.total_ms.get(name, 0.0) + ms
+                self.max_ms[name] = max(self.max_ms.get(name, 0.0), ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": self.count[name],
+                    "mean_ms": round(self.total_ms[name] / self.count[name], 2),
+                    "max_ms": round(self.max_ms[name], 2),
+                }
+                for name in self.count
+            }
@@ -0,0 +1,43 @@
+import threading
+from stage_timer import StageTimer
+
+# --- Background startup ---
+class Startup:
+    # Runs the named startup phases in order on a background thread, so the
+    # server can bind its port and answer liveness checks while models load
+    def __init__(self, phases):
+        self.phases = phases  # [(name, fn)]
+        self.timer = StageTimer()
+        self.current = None
+        self.error = None
+        self.ready_ms = None
+        self.ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, name="startup", daemon=True).start()
+
+    def run(self):
+        try:
+            for name, fn in self.phases:
+                self.current = name
+                with self.timer.stage(name):
+                    fn()
+                start, end = self.timer.stages[name]
+                print(f"⏱️ Startup phase {name}: {end - start:.0f} ms")
+        except Exception as e:
+            self.error = f"{self.current}: {e}"
+            print(f"❌ Startup failed in {self.error}")
+            return
+        self.current = None
+        self.ready_ms = self.timer.elapsed_ms()
+        self.ready.set()
+        print(f"✅ Ready {self.ready_ms:.0f} ms after import")
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "phase": self.current,
+            "error": self.error,
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            "phases": {name: timing for name, timing in self.timer.as_dict().items() if name != "total"},
+        }
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from concurrency import AdmittedStreamingResponse, ConcurrencyLimiter
+
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+
+def admitted(limiter, started):
+    async def body():
+        started.append(True)
+        yield "data: 1\n\n"
+        yield "data: 2\n\n"
+
+    assert limiter.try_acquire()
+    return AdmittedStreamingResponse(body(), limiter, media_type="text/event-stream")
+
+
+async def never_disconnects():
+    await asyncio.Event().wait()
+
+# --- Tests ---
+def test_stream_releases_slot_when_done():
+    limiter, started, sent = ConcurrencyLimiter(1), [], []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(admitted(limiter, started)(SCOPE, never_disconnects, send))
+
+    assert started and sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    assert limiter.stats()["inflight"] == 0
+
+
+def test_disconnect_before_first_chunk_releases_slot():
+    limiter, started = ConcurrencyLimiter(1), []
+
+    async def send(message):
+        raise OSError("client went away")  # fails on http.response.start
+
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(admitted(limiter, started)(SCOPE, never_disconnects, send))
+
+    assert not started  # the body generator never ran, so its finally could not release
+    assert limiter.stats()["inflight"] == 0
+    assert limiter.try_acquire()
+
+
+def test_disconnect_before_start_on_older_asgi_releases_slot():
+    limiter, started = ConcurrencyLimiter(1), []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await asyncio.Event().wait()  # stalls until the disconnect listener cancels the stream
+
+    asyncio.run(admitted(limiter, started)({"type": "http"}, receive, send))
+
+    assert not started
+    assert limiter.stats()["inflight"] == 0
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+from artifacts import SEARCH_INDEX, RecordStore, current_build
+from embedding_store import normalize
+from encoder import ENCODER_MODEL, ONNX_FILES, ONNX_MODEL_DIR
+
+SAMPLE_SIZE = 256  # forum titles and course chunks compared per backend
+PARITY_THRESHOLD = 0.99  # minimum cosine to the PyTorch embedding of the same text
+TOP_K = 3
+TOP_K_AGREEMENT = 0.95  # share of per-source top-k hits that must match PyTorch's
+
+# --- Fixtures ---
+@pytest.fixture(scope="module")
+def texts():
+    try:
+        forum = RecordStore(os.path.join(current_build(), 'forum'))
+        course = RecordStore(os.path.join(current_build(), 'course'))
+    except FileNotFoundError:
+        pytest.skip("no built records; run build_search_index.py")
+    titles = [forum[i]["title"] for i in range(min(len(forum), SAMPLE_SIZE // 2))]
+    chunks = [course[i]["text"] for i in range(min(len(course), SAMPLE_SIZE - len(titles)))]
+    return titles + chunks
+
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    try:
+        model = sentence_transformers.SentenceTransformer(ENCODER_MODEL)
+    except OSError as e:
+        pytest.skip(f"{ENCODER_MODEL} unavailable: {e}")
+    return normalize(model.encode(texts, convert_to_numpy=True))
+
+
+@pytest.fixture(scope="module", params=list(ONNX_FILES))
+def onnx_embeddings(request, texts):
+    # OnnxEncoder directly: load_encoder() would quietly fall back to PyTorch
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    from encoder import OnnxEncoder
+    if not os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_FILES[request.param])):
+        pytest.skip(f"no {request.param} export; run python encoder.py")
+    return normalize(OnnxEncoder(ONNX_MODEL_DIR, request.param).encode(texts))
+
+# --- Tests ---
+def test_onnx_cosine_parity(reference, onnx_embeddings):
+    cosines = np.sum(onnx_embeddings * reference, axis=1)
+    assert cosines.min() >= PARITY_THRESHOLD, f"min cosine {cosines.min():.4f}, mean {cosines.mean():.4f}"
+
+
+def test_onnx_top_k_agreement(reference, onnx_embeddings):
+    from vector_index import load_index
+    try:
+        index = load_index(os.path.join(current_build(), SEARCH_INDEX))
+    except FileNotFoundError:
+        pytest.skip("no search index; run build_search_index.py")
+    expected = index.search_by_source_batch(reference, k=TOP_K)
+    actual = index.search_by_source_batch(onnx_embeddings, k=TOP_K)
+    matched = total = 0
+    for want, got in zip(expected, actual):
+        for source, ids in want.items():
+            matched += len(set(ids) & set(got[source]))
+            total += len(ids)
+    assert matched / total >= TOP_K_AGREEMENT
@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import scrape_data
+from discourse_client import Checkpoint, DiscourseClient
+
+PAGE_SIZE = 30
+
+# --- Fake Discourse ---
+class FakeDiscourse:
+    # Serves /latest.json (paginated) and /t/{id}.json with ETags; records every
+    # request so tests can assert what was (re)fetched
+    def __init__(self, topics=65):
+        self.bumped = {i: "2025-02-01T00:00:00.000Z" for i in range(1, topics + 1)}
+        self.throttle = {}  # path -> number of 429s still to send
+        self.html = set()  # paths answered with a 200 HTML page instead of JSON
+        self.retry_after = "1"
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def topic(self, i):
+        return {"id": i, "title": f"Topic {i}", "post_stream": {"posts": [{
+            "username": "student",
+            "created_at": "2025-02-03T10:00:00.000Z",
+            "cooked": f"<p>Post {i} ({self.bumped[i]})</p><img src='/uploads/{i}.png'>",
+            "raw": f"Post {i}",
+        }]}}
+
+    def topic_fetches(self):
+        with self.lock:
+            return [int(path.split("/")[-1].split(".")[0]) for path in self.requests if path.startswith("/t/")]
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=None, headers=None):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with fake.lock:
+                    fake.requests.append(self.path)
+                    throttled = fake.throttle.get(url.path, 0)
+                    if throttled:
+                        fake.throttle[url.path] = throttled - 1
+                if throttled:
+                    return self.send(429, {}, {"Retry-After": fake.retry_after})
+                if url.path in fake.html:
+                    return self.send(200, b"<html><body>Log in</body></html>", {"Content-Type": "text/html"})
+
+                if url.path == "/latest.json":
+                    page = int(parse_qs(url.query)["page"][0])
+                    ids = sorted(fake.bumped)[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+                    return self.send(200, {"topic_list": {"topics": [
+                        {"id": i, "bumped_at": fake.bumped[i], "posts_count": 1} for i in ids]}})
+
+                topic_id = int(url.path.split("/")[-1].split(".")[0])
+                etag = f'"{topic_id}-{fake.bumped[topic_id]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304)
+                self.send(200, fake.topic(topic_id), {"ETag": etag})
+
+        return Handler
+
+
+@pytest.fixture
+def discourse(tmp_path, monkeypatch):
+    fake = FakeDiscourse()
+    thread = threading.Thread(target=fake.server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("DISCOURSE_URL", fake.url)
+    monkeypatch.setattr(scrape_data, "BASE_URL", fake.url)
+    monkeypatch.setattr(scrape_data, "RATE_LIMIT", 1000.0)
+    monkeypatch.setattr(scrape_data, "CONCURRENCY", 4)
+    monkeypatch.setattr(scrape_data, "SAVE_DIR", str(tmp_path))
+    monkeypatch.setattr(scrape_data, "TOPIC_DIR", str(tmp_path / "topics"))
+    monkeypatch.setattr(scrape_data, "CHECKPOINT_FILE", str(tmp_path / "scrape_checkpoint.json"))
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def make_client(fake):
+    return DiscourseClient(fake.url, headers=scrape_data.HEADERS, concurrency=4, rate=1000.0)
+
+
+def saved_posts(tmp_path):
+    with open(tmp_path / "tds_all_posts.json", encoding="utf-8") as f:
+        return json.load(f)
+
+# --- Tests ---
+def test_latest_pagination(discourse):
+    topics = scrape_data.get_all_topics(make_client(discourse))
+
+    assert [t["id"] for t in topics] == sorted(discourse.bumped)
+    # Three full or partial pages, then the empty page that ends the listing
+    assert [p for p in discourse.requests if p.startswith("/latest.json")] == [
+        f"/latest.json?category={scrape_data.CATEGORY_ID}&page={page}" for page in range(4)]
+
+
+def test_429_is_retried_after_retry_after(discourse):
+    discourse.throttle["/t/1.json"] = 1
+    client = make_client(discourse)
+
+    started = time.monotonic()
+    status, data, etag = client.get_json("/t/1.json")
+
+    assert status == 200 and data["id"] == 1 and etag
+    assert time.monotonic() - started >= 1.0  # waited out Retry-After: 1
+    assert discourse.topic_fetches() == [1, 1]
+    assert client.stats()["requests"] == {200: 1}
+
+
+def test_non_json_200_is_retried_next_run(discourse, tmp_path):
+    client = make_client(discourse)
+    discourse.html.add("/t/3.json")
+    assert client.get_json("/t/3.json") == (None, None, None)
+    assert client.stats()["invalid_json"] == 1
+
+    scrape_data.scrape_all()
+    assert Checkpoint(scrape_data.CHECKPOINT_FILE).get(3) == {}
+    assert not (tmp_path / "topics" / "3.json").exists()
+
+    discourse.html.clear()
+    discourse.requests.clear()
+    scrape_data.scrape_all()
+    assert discourse.topic_fetches() == [3]
+    assert len(saved_posts(tmp_path)) == len(discourse.bumped)
+
+
+def test_etag_revalidation_returns_304(discourse, tmp_path):
+    client = make_client(discourse)
+    status, _, etag = client.get_json("/t/2.json")
+    assert status == 200
+
+    status, data, same_etag = client.get_json("/t/2.json", etag=etag)
+    assert (status, data, same_etag) == (304, None, etag)
+
+    # In the scraper: a topic listed with a new bumped_at but unchanged content
+    # is revalidated with If-None-Match and its cached file is kept
+    scrape_data.scrape_all()
+    cached = (tmp_path / "topics" / "2.json").read_text(encoding="utf-8")
+    checkpoint = Checkpoint(scrape_data.CHECKPOINT_FILE)
+    topic = {"id": 2, "bumped_at": "2025-03-01T00:00:00.000Z", "posts_count": 1}
+    stored_etag = checkpoint.get(2)["etag"]
+
+    assert scrape_data.fetch_topic(client, checkpoint, topic) == (2, 304)
+    assert checkpoint.get(2) == {"bumped_at": topic["bumped_at"], "posts_count": 1, "etag": stored_etag}
+    assert (tmp_path / "topics" / "2.json").read_text(encoding="utf-8") == cached
+
+
+def test_unchanged_topics_are_skipped(discourse, tmp_path):
+    scrape_data.scrape_all()
+    assert sorted(discourse.topic_fetches()) == sorted(discourse.bumped)
+    assert len(saved_posts(tmp_path)) == len(discourse.bumped)
+
+    discourse.requests.clear()
+    scrape_data.scrape_all()
+    assert discourse.topic_fetches() == []
+
+    discourse.bumped[5] = "2025-03-01T00:00:00.000Z"
+    discourse.bumped[7] = "2025-03-01T00:00:00.000Z"
+    discourse.requests.clear()
+    scrape_data.scrape_all()
+    assert sorted(discourse.topic_fetches()) == [5, 7]
+    posts = {post["topic_id"]: post for post in saved_posts(tmp_path)}
+    assert "2025-03-01" in posts[5]["cooked_html"]
+    assert posts[5]["image_urls"] == ["/uploads/5.png"]
+
+
+def test_resume_from_checkpoint_after_interruption(discourse, tmp_path, monkeypatch):
+    fetch_topic = scrape_data.fetch_topic
+    completed = []
+
+    def interrupted_fetch(client, checkpoint, topic):
+        if len(completed) >= 20:
+            raise KeyboardInterrupt
+        result = fetch_topic(client, checkpoint, topic)
+        completed.append(topic["id"])
+        return result
+
+    monkeypatch.setattr(scrape_data, "fetch_topic", interrupted_fetch)
+    with pytest.raises(KeyboardInterrupt):
+        scrape_data.scrape_all()
+
+    with open(scrape_data.CHECKPOINT_FILE, encoding="utf-8") as f:
+        saved = {int(topic_id) for topic_id in json.load(f)["topics"]}
+    assert saved and len(saved) < len(discourse.bumped)
+
+    monkeypatch.setattr(scrape_data, "fetch_topic", fetch_topic)
+    discourse.requests.clear()
+    scrape_data.scrape_all()
+
+    # Only topics missing from the saved checkpoint are fetched again
+    assert sorted(discourse.topic_fetches()) == sorted(set(discourse.bumped) - saved)
+    assert len(saved_posts(tmp_path)) == len(discourse.bumped)
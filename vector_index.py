@@ -0,0 +1,218 @@
+import numpy as np
+from embedding_store import EmbeddingStore, normalize, top_k_indices, top_k_rows
+from artifacts import load_arrays, save_arrays
+
+# --- Config ---
+INDEX_KINDS = ("exact", "ivf")
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_SEED = 42
+
+# --- Helpers ---
+def default_nlist(n):
+    # Roughly sqrt(n) lists keeps both the centroid scan and the list scan small
+    return max(1, min(n, int(round(np.sqrt(n)))))
+
+def spherical_kmeans(vectors, nlist, n_iter=KMEANS_ITERATIONS, seed=KMEANS_SEED):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # Re-seed empty lists with a random vector so no centroid goes dead
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = normalize(centroids)
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids, assignments
+
+# --- Indexes ---
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    @classmethod
+    def build(cls, embeddings, dtype="float32"):
+        return cls(EmbeddingStore.from_embeddings(embeddings, dtype=dtype))
+
+    def search(self, query_embedding, k=3, nprobe=None):
+        return self.store.top_k(query_embedding, k=k)
+
+    def scores(self, query_embedding, nprobe=None):
+        return np.arange(len(self.store)), self.store.scores(query_embedding)
+
+    def to_arrays(self):
+        return self.store.to_arrays()
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(EmbeddingStore.from_arrays(arrays))
+
+
+class IVFIndex:
+    kind = "ivf"
+
+    def __init__(self, store, centroids, list_offsets, list_ids, nprobe=DEFAULT_NPROBE):
+        self.store = store
+        self.centroids = normalize(centroids)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int64)
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, dtype="float32", nlist=None, nprobe=DEFAULT_NPROBE):
+        vectors = normalize(embeddings)
+        nlist = nlist or default_nlist(len(vectors))
+        centroids, assignments = spherical_kmeans(vectors, nlist)
+        # Inverted lists are stored as one flat id array plus offsets (CSR layout)
+        list_ids = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        store = EmbeddingStore.from_embeddings(vectors, dtype=dtype)
+        return cls(store, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def search(self, query_embedding, k=3, nprobe=None):
+        candidates, sims = self.scores(query_embedding, nprobe=nprobe)
+        return candidates[top_k_indices(sims, k)]
+
+    def scores(self, query_embedding, nprobe=None):
+        # nprobe is the recall-vs-latency knob: more lists scanned, higher recall
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        query = normalize(query_embedding)
+        probed = top_k_indices(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probed
+        ])
+        return candidates, self.store.scores(query, ids=candidates)
+
+    def to_arrays(self):
+        return {
+            **self.store.to_arrays(),
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "list_ids": self.list_ids,
+            "nprobe": np.array(self.nprobe),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(EmbeddingStore.from_arrays(arrays), arrays["centroids"], arrays["list_offsets"],
+                   arrays["list_ids"], nprobe=int(arrays["nprobe"]))
+
+
+# One index over several corpora; a source-tag column maps every row back to
+# its corpus, so a single scan (or ANN probe) yields per-source results.
+class MultiSourceIndex:
+    kind = "multi"
+
+    def __init__(self, index, sources, source_names):
+        self.index = index
+        self.sources = np.asarray(sources, dtype=np.int16)
+        self.source_names = [str(name) for name in source_names]
+        self.source_sizes = np.bincount(self.sources, minlength=len(self.source_names))
+        starts = np.concatenate([[0], np.cumsum(self.source_sizes)[:-1]])
+        self.local_ids = np.arange(len(self.sources)) - starts[self.sources]
+        self.source_rows = [np.flatnonzero(self.sources == i) for i in range(len(self.source_names))]
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def build(cls, corpora, kind="exact", **kwargs):
+        names = list(corpora)
+        vectors = np.vstack([normalize(corpora[name]) for name in names])
+        sources = np.concatenate([np.full(len(corpora[name]), i) for i, name in enumerate(names)])
+        return cls(build_index(vectors, kind=kind, **kwargs), sources, names)
+
+    def _grouped(self, ids):
+        # Global row ids -> {source name: local ids}, keeping rank order
+        tags = self.sources[ids]
+        return {name: self.local_ids[ids[tags == i]] for i, name in enumerate(self.source_names)}
+
+    def search_by_source(self, query_embedding, k=3, nprobe=None):
+        nprobe = nprobe or getattr(self.index, "nprobe", None)
+        while True:
+            ids, scores = self.index.scores(query_embedding, nprobe=nprobe)
+            tags = self.sources[ids]
+            results = {}
+            for i, name in enumerate(self.source_names):
+                mask = tags == i
+                results[name] = self.local_ids[ids[mask][top_k_indices(scores[mask], k)]]
+            # An ANN probe can miss a small corpus entirely; widen it until every
+            # source has k hits (or every list has been scanned)
+            short = any(len(results[name]) < min(k, size)
+                        for name, size in zip(self.source_names, self.source_sizes))
+            if not short or nprobe is None or nprobe >= self.index.nlist:
+                return results
+            nprobe *= 2
+
+    def search_by_source_batch(self, query_embeddings, k=3, nprobe=None):
+        # Exact indexes score the whole batch with one matrix-matrix product;
+        # ANN indexes fall back to one probe per query
+        if not isinstance(self.index, ExactIndex):
+            return [self.search_by_source(query, k=k, nprobe=nprobe) for query in query_embeddings]
+        scores = self.index.store.scores_batch(query_embeddings)
+        results = [{} for _ in range(len(scores))]
+        for name, rows in zip(self.source_names, self.source_rows):
+            top = rows[top_k_rows(scores[:, rows], k)]
+            for result, ids in zip(results, self.local_ids[top]):
+                result[name] = ids
+        return results
+
+    def search_interleaved(self, query_embedding, k=6, weights=None, nprobe=None):
+        ids, scores = self.index.scores(query_embedding, nprobe=nprobe)
+        weights = weights or {}
+        source_weights = np.array([weights.get(name, 1.0) for name in self.source_names], dtype=np.float32)
+        weighted = scores * source_weights[self.sources[ids]]
+        return self._grouped(ids[top_k_indices(weighted, k)])
+
+    def to_arrays(self):
+        return {
+            **self.index.to_arrays(),
+            "inner_kind": np.array(self.index.kind),
+            "sources": self.sources,
+            "source_names": np.array(self.source_names),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = INDEX_TYPES[str(arrays["inner_kind"])].from_arrays(arrays)
+        return cls(index, arrays["sources"], arrays["source_names"])
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFIndex, MultiSourceIndex)}
+
+# --- Build / Save / Load ---
+def build_index(embeddings, kind="exact", **kwargs):
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}', expected one of {INDEX_KINDS}")
+    return INDEX_TYPES[kind].build(embeddings, **kwargs)
+
+def save_index(index, directory):
+    return save_arrays(directory, index.to_arrays(), kind=index.kind, size=len(index))
+
+def load_index(directory, nprobe=None, mmap=True):
+    # With mmap the vectors stay in the page cache, shared by every worker
+    manifest, arrays = load_arrays(directory, mmap=mmap)
+    index = INDEX_TYPES[manifest["kind"]].from_arrays(arrays)
+    index.manifest = manifest
+    inner = getattr(index, "index", index)
+    if nprobe and hasattr(inner, "nprobe"):
+        inner.nprobe = nprobe
+    return index